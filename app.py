@@ -1,353 +1,747 @@
 import os
-import uuid
+
+from dotenv import load_dotenv
+
+# ASYNC_MODE may be set in .env, which config.py would only load after patching
+load_dotenv()
+
+# Pool workers started by spawn/forkserver re-import the script that was run
+# under this name; gevent and the background tasks belong to the web process
+POOL_WORKER = __name__ == '__mp_main__'
+
+# Cooperative async mode must patch the stdlib before anything else imports it
+ASYNC_MODE = os.getenv('ASYNC_MODE', 'gevent')
+if POOL_WORKER:
+    ASYNC_MODE = 'threading'
+elif ASYNC_MODE == 'gevent':
+    try:
+        import gevent
+        from gevent import monkey
+        monkey.patch_all()
+    except ImportError:
+        ASYNC_MODE = 'threading'
+
+import atexit
+import secrets
+import time
 import threading
 import psutil
 import platform
 import logging
+import multiprocessing
+import shutil
+import tempfile
+import io
+import re
+import contextlib
 import magic
-from queue import Queue
-from flask import Flask, render_template, request, jsonify, send_file
+import orjson
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from queue import Queue, LifoQueue, Empty, Full
+from flask import Flask, Request, Response, render_template, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_socketio import SocketIO, emit, join_room
 from werkzeug.utils import secure_filename
-import json
+from urllib.parse import quote
 from datetime import datetime
-from dotenv import load_dotenv
 
 from watermark.dct_watermark import DCTWatermark
 from watermark.video_processor import VideoProcessor
 import config
+from worker import init_worker, process_video_task
+from registry import FileRegistry
+from status_store import StatusStore
+from logging_setup import setup_logging
 from security import (
     setup_security_middleware, rate_limit, secure_endpoint,
     validate_video_upload, validate_watermark_text, validate_strength_parameter
 )
 
-# Load environment variables
-load_dotenv()
+if ASYNC_MODE == 'gevent':
+    # Real threads although threading is patched; the futures still cooperate with the hub
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+else:
+    NativeThreadPoolExecutor = ThreadPoolExecutor
 
 # Setup logging
-def setup_logging():
-    """Setup logging configuration"""
-    log_dir = os.path.dirname(config.LOG_FILE)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir, exist_ok=True)
-    
-    logging.basicConfig(
-        level=getattr(logging, config.LOG_LEVEL, logging.INFO),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(config.LOG_FILE),
-            logging.StreamHandler()
-        ]
-    )
-
 setup_logging()
 logger = logging.getLogger(__name__)
 
+class UploadRequest(Request):
+    """Request that keeps larger uploads in memory before spooling to disk"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Spool next to the upload folder so an on-disk spool can be copied with sendfile
+        return tempfile.SpooledTemporaryFile(
+            max_size=config.UPLOAD_SPOOL_SIZE, mode='rb+', dir=app.config['UPLOAD_FOLDER']
+        )
+
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes responses with orjson"""
+    
+    OPTIONS = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.OPTIONS).decode()
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = config.SECRET_KEY
+app.use_x_sendfile = config.USE_X_SENDFILE
 
 # Setup security middleware
 setup_security_middleware(app)
 
 # Setup CORS origins
 cors_origins = config.CORS_ORIGINS.split(',') if config.CORS_ORIGINS != '*' else "*"
-socketio = SocketIO(app, cors_allowed_origins=cors_origins, async_mode='threading')
+socketio = SocketIO(
+    app,
+    cors_allowed_origins=cors_origins,
+    async_mode=ASYNC_MODE,
+    http_compression=True,
+    compression_threshold=config.SOCKETIO_COMPRESSION_THRESHOLD
+)
 
-# Configuration
-UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
-PROCESSED_FOLDER = os.getenv('PROCESSED_FOLDER', 'processed')
-ALLOWED_EXTENSIONS = set(config.ALLOWED_EXTENSIONS)
-MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', config.MAX_FILE_SIZE_MB * 1024 * 1024))
+# Configuration (all values come from config.py)
+# Lowercase extensions with the leading dot, as returned by os.path.splitext
+ALLOWED_EXTENSIONS = frozenset('.' + ext.lower() for ext in config.ALLOWED_EXTENSIONS)
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+app.config['UPLOAD_FOLDER'] = config.UPLOAD_FOLDER
+app.config['PROCESSED_FOLDER'] = config.PROCESSED_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_CONTENT_LENGTH
 
 # Ensure directories exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(config.PROCESSED_FOLDER, exist_ok=True)
+
+# Processing pool and status tracking
+# DCT watermarking is CPU-bound, so tasks run in separate processes (one per
+# physical core) instead of a GIL-bound thread inside the Flask process.
+WORKER_PROCESSES = config.WORKER_PROCESSES or psutil.cpu_count(logical=False) or os.cpu_count() or 1
+# Split the cores between workers so their OpenCV thread pools don't oversubscribe the CPU
+WORKER_CV_THREADS = config.WORKER_CV_THREADS or max(1, (os.cpu_count() or 1) // WORKER_PROCESSES)
+# Workers start from a clean forkserver (or spawned) process rather than a fork
+# of this one, which would copy the running progress dispatcher (under gevent
+# it then drains progress_queue inside the worker) and the parent's CV threads
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+mp_context = multiprocessing.get_context(POOL_START_METHOD)
+
+def create_executor():
+    """Start a process pool whose workers report progress on progress_queue"""
+    return ProcessPoolExecutor(
+        max_workers=WORKER_PROCESSES,
+        mp_context=mp_context,
+        initializer=init_worker,
+        initargs=(progress_queue, WORKER_CV_THREADS)
+    )
+
+# Pool workers re-import this module as __mp_main__ but only run worker.py;
+# the pool, registry and libmagic state below belong to the web process
+if POOL_WORKER:
+    progress_queue = executor = None
+else:
+    progress_queue = mp_context.Queue()
+    executor = create_executor()
+executor_lock = threading.Lock()
+task_slots = threading.BoundedSemaphore(config.MAX_PENDING_TASKS)
+processing_status = StatusStore(max_entries=config.MAX_TRACKED_TASKS, ttl=config.STATUS_TTL)
+
+# Server-Sent Events listeners: task_id -> set of single-slot queues
+event_subscribers = {}
+event_subscribers_lock = threading.Lock()
+
+# Chunked uploads in progress: upload_id -> received parts, their total size,
+# whether the upload was rejected or is being merged, and its last activity
+chunk_uploads = {}
+chunk_uploads_lock = threading.Lock()
+merge_slots = threading.BoundedSemaphore(config.MAX_CONCURRENT_MERGES)
+UPLOAD_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{8,64}')
+CHUNK_PART_PATTERN = re.compile(r'([A-Za-z0-9_-]{8,64})\.part\d+(\.[0-9a-f]+)?')
+
+# Cached system usage for the monitoring endpoints
+sysinfo_cache = {'ts': 0.0, 'data': None}
+sysinfo_lock = threading.Lock()
+psutil.cpu_percent(interval=None)  # first call only primes the counter
 
-# Processing queue and status tracking
-processing_queue = Queue()
-processing_status = {}
-file_registry = {}
+# VideoProcessor holds no per-call state, so one instance serves every request.
+# DCTWatermark keeps scratch buffers, so requests borrow one from a pool that
+# grows to the peak number of concurrent extractions (a thread-local would be
+# greenlet-local under gevent, i.e. a new instance per request).
+video_processor = VideoProcessor()
+watermarker_pool = LifoQueue()
+
+@contextlib.contextmanager
+def borrow_watermarker():
+    """Lend a DCTWatermark to one request, creating one if all are in use"""
+    try:
+        watermarker = watermarker_pool.get_nowait()
+    except Empty:
+        watermarker = DCTWatermark()
+    watermarker.reset()
+    try:
+        yield watermarker
+    finally:
+        watermarker_pool.put(watermarker)
+
+# Web process only, like the pool; libmagic's database is loaded once per
+# process, not per upload
+if POOL_WORKER:
+    file_registry = mime_detector = None
+else:
+    file_registry = FileRegistry(os.path.join(config.PROCESSED_FOLDER, 'registry.db'))
+    mime_detector = magic.Magic(mime=True)
+MAGIC_HEADER_SIZE = 8192
+VIDEO_MIME_TYPES = frozenset({
+    'video/mp4',
+    'video/avi',
+    'video/x-msvideo',
+    'video/quicktime',
+    'video/x-matroska',
+    'video/x-ms-wmv',
+    'video/x-flv',
+    'video/webm'
+})
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
 
-def validate_file_magic(file_path):
-    """Validate file using magic numbers (MIME type detection)"""
+def _upload_fileno(stream):
+    """Return the file descriptor behind an upload stream if it is on disk"""
+    # Asking an in-memory SpooledTemporaryFile for its fileno would force a rollover
+    if isinstance(stream, tempfile.SpooledTemporaryFile) and not stream._rolled:
+        return None
     try:
-        mime = magic.from_file(file_path, mime=True)
-        logger.info(f"Detected MIME type: {mime} for file: {file_path}")
-        
-        # Video MIME types
-        allowed_video_mimes = [
-            'video/mp4',
-            'video/avi', 
-            'video/x-msvideo',
-            'video/quicktime',
-            'video/x-matroska',
-            'video/x-ms-wmv',
-            'video/x-flv',
-            'video/webm'
-        ]
-        
-        return mime in allowed_video_mimes
-    except ImportError:
-        logger.warning("python-magic not available, falling back to extension-only validation")
-        return True  # Fallback to extension validation only
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def _sendfile_all(out_fd, src_fd):
+    """Copy a whole file between descriptors in the kernel with os.sendfile"""
+    offset = 0
+    while True:
+        sent = os.sendfile(out_fd, src_fd, offset, config.UPLOAD_CHUNK_SIZE)
+        if sent == 0:
+            break
+        offset += sent
+
+def save_upload(file, path):
+    """
+    Write an uploaded file to disk with large buffers
+    
+    Uses os.sendfile for uploads already spooled to disk (kernel-side copy),
+    otherwise copies the stream in UPLOAD_CHUNK_SIZE chunks.
+    """
+    src_fd = _upload_fileno(file.stream)
+    with open(path, 'wb', buffering=0) as out:
+        if src_fd is not None and hasattr(os, 'sendfile'):
+            _sendfile_all(out.fileno(), src_fd)
+        else:
+            file.stream.seek(0)
+            shutil.copyfileobj(file.stream, out, length=config.UPLOAD_CHUNK_SIZE)
+
+def read_upload_header(stream):
+    """Peek at the first MAGIC_HEADER_SIZE bytes of an upload stream"""
+    stream.seek(0)
+    header = stream.read(MAGIC_HEADER_SIZE)
+    stream.seek(0)
+    return header
+
+def validate_file_magic(header):
+    """Validate a file's leading bytes using magic numbers (MIME type detection)"""
+    try:
+        mime = mime_detector.from_buffer(header)
+        logger.debug("Detected MIME type: %s", mime)
+        return mime in VIDEO_MIME_TYPES
     except Exception as e:
         logger.error(f"Error validating file magic: {e}")
         return False
 
-def load_file_registry():
-    """Load file registry from disk"""
-    registry_file = os.path.join(PROCESSED_FOLDER, 'registry.json')
-    if os.path.exists(registry_file):
+def save_temp_video(file, prefix=''):
+    """
+    Save an upload for one-off analysis if its header looks like a video
+    
+    Non-video content is rejected from the first bytes of the stream, so
+    nothing is written to disk for it.
+    
+    Returns:
+        Path of the saved file, or None if the upload was rejected
+    """
+    if not validate_file_magic(read_upload_header(file.stream)):
+        return None
+    temp_path = os.path.join(
+        app.config['UPLOAD_FOLDER'],
+        f"{prefix}{secrets.token_urlsafe(12)}_{secure_filename(file.filename)}"
+    )
+    save_upload(file, temp_path)
+    return temp_path
+
+def run_blocking(func, *args):
+    """
+    Run CPU-bound OpenCV work for a request without stalling the server
+    
+    Under gevent the call goes to the hub's native thread pool, so other
+    greenlets keep running while OpenCV and NumPy work with the GIL released.
+    In threading mode the request already has its own thread.
+    """
+    if ASYNC_MODE == 'gevent':
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+def magic_error(original_filename):
+    """Error reported for uploads whose content is not a video"""
+    return f'{original_filename}: Invalid video file format (magic number check failed)'
+
+def expire_chunk_uploads():
+    """
+    Drop chunked uploads idle for CHUNK_UPLOAD_TTL and delete their parts
+    
+    Part files on disk that no tracked upload owns (e.g. left by a restart)
+    are deleted once they are older than the TTL as well.
+    
+    Returns:
+        Number of uploads dropped
+    """
+    cutoff = time.monotonic() - config.CHUNK_UPLOAD_TTL
+    with chunk_uploads_lock:
+        expired = [upload_id for upload_id, upload in chunk_uploads.items()
+                   if upload['updated'] < cutoff and not upload['merging']]
+        for upload_id in expired:
+            del chunk_uploads[upload_id]
+        active = set(chunk_uploads)
+    
+    file_cutoff = time.time() - config.CHUNK_UPLOAD_TTL
+    with os.scandir(app.config['UPLOAD_FOLDER']) as entries:
+        for entry in entries:
+            match = CHUNK_PART_PATTERN.fullmatch(entry.name)
+            if match and match.group(1) not in active:
+                with contextlib.suppress(FileNotFoundError):
+                    if entry.stat().st_mtime < file_cutoff:
+                        os.remove(entry.path)
+    return len(expired)
+
+def status_reaper():
+    """Periodically evict old finished task statuses and abandoned uploads"""
+    while True:
+        socketio.sleep(60)
         try:
-            with open(registry_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def save_file_registry():
-    """Save file registry to disk"""
-    registry_file = os.path.join(PROCESSED_FOLDER, 'registry.json')
-    with open(registry_file, 'w') as f:
-        json.dump(file_registry, f, indent=2)
-
-def process_video_worker():
-    """Background worker for processing videos"""
-    logger.info("🔧 Background worker started")
+            evicted = processing_status.evict_expired()
+            if evicted:
+                logger.debug("Evicted %d finished task statuses", evicted)
+        except Exception as e:
+            logger.error(f"❌ Error evicting task statuses: {e}", exc_info=True)
+        try:
+            expired = expire_chunk_uploads()
+            if expired:
+                logger.info("Dropped %d abandoned chunked uploads", expired)
+        except Exception as e:
+            logger.error(f"❌ Error dropping abandoned uploads: {e}", exc_info=True)
+
+def get_system_snapshot():
+    """
+    CPU, memory and disk usage, cached for SYSTEM_INFO_CACHE_TTL seconds
+    
+    cpu_percent is sampled without blocking: it reports usage since the
+    previous sample, which the cache interval keeps meaningful.
+    """
+    # Fast path: a fresh snapshot is served without taking the lock
+    data = sysinfo_cache['data']
+    if data is not None and time.monotonic() - sysinfo_cache['ts'] < config.SYSTEM_INFO_CACHE_TTL:
+        return data
+    
+    with sysinfo_lock:
+        now = time.monotonic()
+        # Another request may have refreshed it while we waited
+        if sysinfo_cache['data'] is None or now - sysinfo_cache['ts'] >= config.SYSTEM_INFO_CACHE_TTL:
+            sysinfo_cache['data'] = {
+                'cpu_percent': psutil.cpu_percent(interval=None),
+                'memory': psutil.virtual_memory(),
+                'disk': psutil.disk_usage('/')
+            }
+            sysinfo_cache['ts'] = now
+        return sysinfo_cache['data']
+
+def get_queue_size():
+    """Number of tasks waiting for a free worker process"""
+    return processing_status.count('queued')
+
+def _offer_latest(updates, status):
+    """Put status in a single-slot queue, replacing an unread older one"""
     while True:
         try:
-            logger.debug("⏳ Waiting for tasks...")
-            task = processing_queue.get()
-            if task is None:
+            updates.put_nowait(status)
+            return
+        except Full:
+            with contextlib.suppress(Empty):
+                updates.get_nowait()
+
+def publish_status(status):
+    """Push a task status to its SocketIO room and any SSE listeners"""
+    task_id = status['task_id']
+    socketio.emit('processing_update', status, room=task_id)
+    with event_subscribers_lock:
+        listeners = list(event_subscribers.get(task_id, ()))
+    for updates in listeners:
+        _offer_latest(updates, status)
+
+def drain_progress_reports(max_batch):
+    """
+    Pull up to max_batch pending progress reports without blocking
+    
+    Reports are coalesced per task, keeping only the latest, so a burst
+    from several workers costs one status update and emit per task.
+    
+    Returns:
+        Dict of task_id -> (frame_num, total_frames, message)
+    """
+    latest = {}
+    for _ in range(max_batch):
+        try:
+            task_id, frame_num, total_frames, message = progress_queue.get_nowait()
+        except Empty:
+            break
+        latest[task_id] = (frame_num, total_frames, message)
+    return latest
+
+def progress_dispatcher():
+    """Relay progress reports from pool processes to SocketIO clients"""
+    logger.info("🔧 Progress dispatcher started")
+    while True:
+        try:
+            # Poll without blocking so the loop also cooperates under gevent
+            try:
+                batch = drain_progress_reports(config.PROGRESS_BATCH_SIZE)
+            except (EOFError, OSError):
+                # Queue was closed during interpreter shutdown
                 break
-            logger.info(f"📋 Processing task: {task['id']}")
-            
-            task_id = task['id']
-            input_path = task['input_path']
-            output_path = task['output_path']
-            watermark_text = task['watermark_text']
-            strength = task['strength']
-            original_filename = task['original_filename']
-            
-            # Update status
-            processing_status[task_id] = {
-                'task_id': task_id,
-                'status': 'processing',
-                'progress': 0,
-                'message': 'Initializing...'
-            }
-            socketio.emit('processing_update', processing_status[task_id], room=task_id)
-            
-            # Initialize watermarking
-            watermarker = DCTWatermark()
-            processor = VideoProcessor()
             
-            def progress_callback(frame_num, total_frames, message="Processing"):
-                progress = int((frame_num / total_frames) * 100)
-                processing_status[task_id] = {
-                    'task_id': task_id,
-                    'status': 'processing',
-                    'progress': progress,
-                    'message': f'{message} frame {frame_num}/{total_frames}... {progress}%'
-                }
-                socketio.emit('processing_update', processing_status[task_id], room=task_id)
-            
-            # Process video
-            logger.info(f"Starting video processing for task {task_id}: {original_filename}")
-            success = processor.embed_watermark_in_video(
-                input_path, output_path, watermark_text, strength, 
-                watermarker, progress_callback
-            )
+            if not batch:
+                socketio.sleep(0.05)
+                continue
             
-            if success:
-                logger.info(f"Video processing completed successfully for task {task_id}")
-                # Update file registry
-                file_info = {
-                    'id': task_id,
-                    'original_filename': original_filename,
-                    'processed_filename': os.path.basename(output_path),
-                    'watermark_text': watermark_text,
-                    'strength': strength,
-                    'processed_date': datetime.now().isoformat(),
-                    'file_size': os.path.getsize(output_path)
-                }
-                file_registry[task_id] = file_info
-                save_file_registry()
+            for task_id, (frame_num, total_frames, message) in batch.items():
+                if total_frames:
+                    progress = int((frame_num / total_frames) * 100)
+                    message = f'{message} frame {frame_num}/{total_frames}... {progress}%'
+                else:
+                    progress = 0
                 
-                processing_status[task_id] = {
-                    'task_id': task_id,
-                    'status': 'completed',
-                    'progress': 100,
-                    'message': 'Processing completed successfully!'
-                }
-            else:
-                logger.error(f"Video processing failed for task {task_id}")
-                processing_status[task_id] = {
-                    'task_id': task_id,
-                    'status': 'error',
-                    'progress': 0,
-                    'message': 'Processing failed. Please try again.'
-                }
+                # Late reports for a finished task are ignored
+                status = processing_status.set(task_id, 'processing', progress, message)
+                if status:
+                    publish_status(status)
+        except Exception as e:
+            logger.error(f"❌ Error dispatching progress update: {e}", exc_info=True)
+
+def handle_task_done(task, future):
+    """Record the outcome of a finished task and clean up its files"""
+    task_id = task['id']
+    input_path = task['input_path']
+    output_path = task['output_path']
+    
+    try:
+        error = future.exception()
+        success, output_size = future.result() if error is None else (False, 0)
+        
+        if success:
+            logger.info(f"Video processing completed successfully for task {task_id}")
+            # Update file registry
+            file_info = {
+                'id': task_id,
+                'original_filename': task['original_filename'],
+                'processed_filename': os.path.basename(output_path),
+                'watermark_text': task['watermark_text'],
+                'strength': task['strength'],
+                'processed_date': datetime.now().isoformat(),
+                'file_size': output_size
+            }
+            file_registry.add(file_info)
             
-            socketio.emit('processing_update', processing_status[task_id], room=task_id)
+            status = processing_status.set(task_id, 'completed', 100, 'Processing completed successfully!')
+        elif error is not None:
+            logger.error(f"❌ Error processing task {task_id}: {error}", exc_info=error)
+            status = processing_status.set(task_id, 'error', 0, f'Processing failed: {str(error)}')
             
-            # Clean up input file on success
-            if os.path.exists(input_path):
-                try:
-                    os.remove(input_path)
-                    logger.debug(f"Cleaned up input file: {input_path}")
-                except OSError as e:
-                    logger.warning(f"Could not remove input file {input_path}: {e}")
-                
-        except Exception as e:
-            logger.error(f"❌ Error processing task {task.get('id', 'unknown')}: {e}", exc_info=True)
-            if 'task_id' in locals():
-                processing_status[task_id] = {
-                    'task_id': task_id,
-                    'status': 'error',
-                    'progress': 0,
-                    'message': f'Processing failed: {str(e)}'
-                }
-                socketio.emit('processing_update', processing_status[task_id], room=task_id)
-                
-                # Clean up files on error
-                for path in [input_path, output_path]:
-                    if 'path' in locals() and os.path.exists(path):
-                        try:
-                            os.remove(path)
-                            logger.debug(f"Cleaned up file on error: {path}")
-                        except OSError:
-                            pass
-        finally:
-            processing_queue.task_done()
+            # Clean up partial output on error
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(output_path)
+                logger.debug("Cleaned up file on error: %s", output_path)
+        else:
+            logger.error(f"Video processing failed for task {task_id}")
+            status = processing_status.set(task_id, 'error', 0, 'Processing failed. Please try again.')
+        
+        if status:
+            publish_status(status)
+        
+        # Clean up input file
+        try:
+            os.unlink(input_path)
+            logger.debug("Cleaned up input file: %s", input_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove input file {input_path}: {e}")
+    except Exception as e:
+        logger.error(f"❌ Error finalizing task {task_id}: {e}", exc_info=True)
+    finally:
+        task_slots.release()
+
+def submit_task(task):
+    """
+    Hand a task to the process pool
+    
+    Returns:
+        True if the task was queued, False if the queue is full
+    """
+    if not task_slots.acquire(blocking=False):
+        return False
+    
+    pool = executor
+    try:
+        try:
+            future = pool.submit(process_video_task, task)
+        except BrokenProcessPool:
+            # A worker died abruptly (e.g. OOM killed); later tasks get a fresh pool
+            future = replace_broken_executor(pool).submit(process_video_task, task)
+    except BaseException:
+        # handle_task_done will never run for this task
+        task_slots.release()
+        raise
+    
+    future.add_done_callback(lambda f: handle_task_done(task, f))
+    return True
+
+def replace_broken_executor(broken):
+    """Swap a broken process pool for a new one, once across concurrent callers"""
+    global executor
+    with executor_lock:
+        if executor is broken:
+            logger.warning("Process pool is broken, starting a new one")
+            broken.shutdown(wait=False, cancel_futures=True)
+            executor = create_executor()
+        return executor
 
-# Start background worker
-worker_thread = threading.Thread(target=process_video_worker, daemon=True)
-worker_thread.start()
+def shutdown_executor():
+    """Stop the worker processes and close the progress queue at exit"""
+    executor.shutdown(wait=True, cancel_futures=True)
+    progress_queue.close()
+    progress_queue.join_thread()
 
-# Load existing file registry
-file_registry = load_file_registry()
+# Start progress dispatcher and status eviction, and stop the pool at exit
+if not POOL_WORKER:
+    atexit.register(shutdown_executor)
+    dispatcher_task = socketio.start_background_task(progress_dispatcher)
+    reaper_task = socketio.start_background_task(status_reaper)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/upload', methods=['POST'])
-@rate_limit(limit=10, window=60)  # 10 uploads per minute
-@secure_endpoint
-def upload_file():
-    if 'files' not in request.files:
-        return jsonify({'error': 'No files selected'}), 400
+def parse_watermark_options(form):
+    """
+    Validate the watermarking fields of an upload form
     
-    files = request.files.getlist('files')
-    watermark_text = request.form.get('watermark_text', '')
+    Returns:
+        Tuple of (options, error_message); options holds watermark_text,
+        strength and frame_stride
+    """
+    watermark_text = form.get('watermark_text', '')
     
     # Validate watermark text
     if not watermark_text.strip():
-        return jsonify({'error': 'Watermark text cannot be empty'}), 400
+        return None, 'Watermark text cannot be empty'
     
     if len(watermark_text) > config.MAX_WATERMARK_LENGTH:
-        return jsonify({'error': f'Watermark text too long (max {config.MAX_WATERMARK_LENGTH} characters)'}), 400
+        return None, f'Watermark text too long (max {config.MAX_WATERMARK_LENGTH} characters)'
     
     # Validate and parse strength
     try:
-        strength = float(request.form.get('strength', config.DEFAULT_STRENGTH))
+        strength = float(form.get('strength', config.DEFAULT_STRENGTH))
         if not (config.MIN_STRENGTH <= strength <= config.MAX_STRENGTH):
-            return jsonify({'error': f'Strength must be between {config.MIN_STRENGTH} and {config.MAX_STRENGTH}'}), 400
+            return None, f'Strength must be between {config.MIN_STRENGTH} and {config.MAX_STRENGTH}'
+    except (ValueError, TypeError):
+        return None, 'Invalid strength value'
+    
+    # Watermark every Nth frame (1 = every frame)
+    try:
+        frame_stride = int(form.get('frame_stride', 1))
+        if not (1 <= frame_stride <= config.MAX_FRAME_STRIDE):
+            return None, f'Frame stride must be between 1 and {config.MAX_FRAME_STRIDE}'
     except (ValueError, TypeError):
-        return jsonify({'error': 'Invalid strength value'}), 400
+        return None, 'Invalid frame stride value'
+    
+    return {
+        'watermark_text': watermark_text,
+        'strength': strength,
+        'frame_stride': frame_stride
+    }, None
+
+def enqueue_video(task_id, original_filename, input_path, options):
+    """
+    Validate a saved upload and queue it for watermarking
+    
+    The caller has already checked the file's magic number. The input file
+    is removed if it is rejected. options is the dict returned by
+    parse_watermark_options().
+    
+    Returns:
+        Error message, or None if the task was queued
+    """
+    # Validate video file with OpenCV
+    if not run_blocking(video_processor.validate_video_file, input_path):
+        os.remove(input_path)  # Clean up invalid file
+        logger.warning(f"OpenCV validation failed for file: {original_filename}")
+        return f'{original_filename}: Invalid or corrupted video file'
+    
+    # Prepare output path
+    name, ext = os.path.splitext(original_filename)
+    output_filename = f"{task_id}_watermarked_{name}{ext}"
+    output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
+    
+    # Add to processing queue
+    task = {
+        'id': task_id,
+        'input_path': input_path,
+        'output_path': output_path,
+        'watermark_text': options['watermark_text'],
+        'strength': options['strength'],
+        'frame_stride': options['frame_stride'],
+        'original_filename': original_filename,
+        'capture_opts': {'buffer_size': config.CAPTURE_BUFFER_SIZE}
+    }
+    
+    # Initialize status before submitting so a fast worker can't race it
+    processing_status.set(task_id, 'queued', 0, 'Queued for processing...')
+    
+    try:
+        queued = submit_task(task)
+    except Exception:
+        processing_status.remove(task_id)
+        raise
+    
+    if not queued:
+        processing_status.remove(task_id)
+        os.remove(input_path)
+        logger.warning(f"Processing queue full, rejected task: {task_id}")
+        return f'{original_filename}: Processing queue is full, please try again later'
+    logger.info(f"Queued task {task_id} - {original_filename}")
+    
+    return None
+
+def save_video_upload(file):
+    """
+    Sniff and save one uploaded file
+    
+    Touches nothing but the file itself, so the files of one request can be
+    saved from several native threads.
+    
+    Returns:
+        Tuple of ((task_id, original filename, saved path) or None, error message or None)
+    """
+    if not allowed_file(file.filename):
+        return None, f'{file.filename}: File type not supported'
+    
+    input_path = None
+    try:
+        # Generate unique task ID
+        task_id = secrets.token_urlsafe(12)
+        
+        # Secure filename
+        original_filename = secure_filename(file.filename)
+        if not original_filename:
+            return None, f'{file.filename}: Invalid filename'
+        
+        # Sniff the type before anything is written to disk
+        if not validate_file_magic(read_upload_header(file.stream)):
+            logger.warning(f"Magic number validation failed for file: {original_filename}")
+            return None, magic_error(original_filename)
+            
+        filename = f"{task_id}_{original_filename}"
+        
+        # Save uploaded file
+        input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        save_upload(file, input_path)
+        
+        return (task_id, original_filename, input_path), None
+        
+    except Exception as e:
+        logger.error(f"Error uploading file {file.filename}: {e}", exc_info=True)
+        # Clean up any partially created files
+        if input_path and os.path.exists(input_path):
+            os.remove(input_path)
+        return None, f'{file.filename}: Upload failed - {str(e)}'
+
+def save_and_probe_upload(file):
+    """
+    save_video_upload() followed by the OpenCV probe of the saved file
+    
+    For the save pool of multi-file requests: the files' first-frame decodes
+    overlap there, and enqueue_video's validation then reads the cached probe.
+    """
+    saved, error = save_video_upload(file)
+    if saved:
+        video_processor.validate_video_file(saved[2])
+    return saved, error
+
+def enqueue_upload(saved, options):
+    """
+    Queue a file saved by save_video_upload() for watermarking
+    
+    Returns:
+        Tuple of (uploaded file dict or None, error message or None)
+    """
+    task_id, original_filename, input_path = saved
+    try:
+        error = enqueue_video(task_id, original_filename, input_path, options)
+    except Exception as e:
+        logger.error(f"Error queueing file {original_filename}: {e}", exc_info=True)
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        return None, f'{original_filename}: Upload failed - {str(e)}'
+    
+    if error:
+        return None, error
+    return {'task_id': task_id, 'filename': original_filename}, None
+
+@app.route('/upload', methods=['POST'])
+@rate_limit(limit=10, window=60)  # 10 uploads per minute
+@secure_endpoint
+def upload_file():
+    if 'files' not in request.files:
+        return jsonify({'error': 'No files selected'}), 400
+    
+    files = request.files.getlist('files')
+    options, error = parse_watermark_options(request.form)
+    if error:
+        return jsonify({'error': error}), 400
     
     if not files or all(file.filename == '' for file in files):
         return jsonify({'error': 'No files selected'}), 400
     
-    uploaded_files = []
-    errors = []
+    accepted = [file for file in files if file and file.filename]
+    if len(accepted) > 1:
+        # Saving and probing are independent per file; queueing stays in the request
+        workers = min(len(accepted), config.UPLOAD_SAVE_WORKERS)
+        with NativeThreadPoolExecutor(max_workers=workers) as save_pool:
+            saved = list(save_pool.map(save_and_probe_upload, accepted))
+    else:
+        saved = [save_video_upload(file) for file in accepted]
     
-    for file in files:
-        if file and file.filename:
-            if not allowed_file(file.filename):
-                errors.append(f'{file.filename}: File type not supported')
-                continue
-                
-            try:
-                # Generate unique task ID
-                task_id = str(uuid.uuid4())
-                
-                # Secure filename
-                original_filename = secure_filename(file.filename)
-                if not original_filename:
-                    errors.append(f'{file.filename}: Invalid filename')
-                    continue
-                    
-                filename = f"{task_id}_{original_filename}"
-                
-                # Save uploaded file
-                input_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(input_path)
-                
-                # Validate file using magic numbers
-                if not validate_file_magic(input_path):
-                    os.remove(input_path)
-                    errors.append(f'{original_filename}: Invalid video file format (magic number check failed)')
-                    logger.warning(f"Magic number validation failed for file: {original_filename}")
-                    continue
-                
-                # Validate video file with OpenCV
-                processor = VideoProcessor()
-                if not processor.validate_video_file(input_path):
-                    os.remove(input_path)  # Clean up invalid file
-                    errors.append(f'{original_filename}: Invalid or corrupted video file')
-                    logger.warning(f"OpenCV validation failed for file: {original_filename}")
-                    continue
-                
-                # Prepare output path
-                name, ext = os.path.splitext(original_filename)
-                output_filename = f"{task_id}_watermarked_{name}{ext}"
-                output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-                
-                # Add to processing queue
-                task = {
-                    'id': task_id,
-                    'input_path': input_path,
-                    'output_path': output_path,
-                    'watermark_text': watermark_text,
-                    'strength': strength,
-                    'original_filename': original_filename
-                }
-                
-                print(f"🔄 Adding task to queue: {task_id}")
-                logger.info(f"Adding task to processing queue: {task_id} - {original_filename}")
-                processing_queue.put(task)
-                print(f"📊 Queue size: {processing_queue.qsize()}")
-                logger.debug(f"Current queue size: {processing_queue.qsize()}")
-                
-                # Initialize status
-                processing_status[task_id] = {
-                    'task_id': task_id,
-                    'status': 'queued',
-                    'progress': 0,
-                    'message': 'Queued for processing...'
-                }
-                
-                uploaded_files.append({
-                    'task_id': task_id,
-                    'filename': original_filename
-                })
-                
-            except Exception as e:
-                logger.error(f"Error uploading file {file.filename}: {e}", exc_info=True)
-                errors.append(f'{file.filename}: Upload failed - {str(e)}')
-                # Clean up any partially created files
-                if 'input_path' in locals() and os.path.exists(input_path):
-                    os.remove(input_path)
+    results = [enqueue_upload(upload, options) if upload else (None, error) for upload, error in saved]
+    
+    uploaded_files = [uploaded for uploaded, error in results if uploaded]
+    errors = [error for uploaded, error in results if error]
     
     response = {
         'message': f'Successfully uploaded {len(uploaded_files)} file(s)',
@@ -361,45 +755,258 @@ def upload_file():
     status_code = 200 if uploaded_files else 400
     return jsonify(response), status_code
 
+def merge_chunks(upload_id, total_chunks, output_path):
+    """Concatenate the received parts of a chunked upload and remove them"""
+    with merge_slots:
+        with open(output_path, 'wb', buffering=0) as out:
+            for index in range(total_chunks):
+                part_path = chunk_part_path(upload_id, index)
+                with open(part_path, 'rb', buffering=0) as part:
+                    if hasattr(os, 'sendfile'):
+                        _sendfile_all(out.fileno(), part.fileno())
+                    else:
+                        shutil.copyfileobj(part, out, length=config.UPLOAD_CHUNK_SIZE)
+        for index in range(total_chunks):
+            os.remove(chunk_part_path(upload_id, index))
+
+def chunk_part_path(upload_id, index):
+    """Path of one received part of a chunked upload"""
+    return os.path.join(app.config['UPLOAD_FOLDER'], f"{upload_id}.part{index}")
+
+@app.route('/upload/chunk', methods=['POST'])
+@rate_limit(limit=600, window=60)  # chunks of parallel uploads
+@secure_endpoint
+def upload_chunk():
+    """Receive one part of a chunked upload; the last part queues the video"""
+    if 'chunk' not in request.files:
+        return jsonify({'error': 'No chunk uploaded'}), 400
+    
+    upload_id = request.form.get('upload_id', '')
+    if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+        return jsonify({'error': 'Invalid upload id'}), 400
+    
+    try:
+        chunk_index = int(request.form.get('chunk_index', ''))
+        total_chunks = int(request.form.get('total_chunks', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid chunk index'}), 400
+    
+    if not (0 < total_chunks <= config.MAX_UPLOAD_CHUNKS and 0 <= chunk_index < total_chunks):
+        return jsonify({'error': 'Invalid chunk index'}), 400
+    
+    filename = request.form.get('filename', '')
+    if not allowed_file(filename):
+        return jsonify({'error': f'{filename}: File type not supported'}), 400
+    
+    original_filename = secure_filename(filename)
+    if not original_filename:
+        return jsonify({'error': f'{filename}: Invalid filename'}), 400
+    
+    options, error = parse_watermark_options(request.form)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Saved under a name of its own first, so a re-sent part cannot replace
+    # the copy already counted against the size limit
+    part_path = chunk_part_path(upload_id, chunk_index)
+    received_path = f"{part_path}.{secrets.token_hex(4)}"
+    save_upload(request.files['chunk'], received_path)
+    part_size = os.path.getsize(received_path)
+    
+    # Parts may arrive in any order; the request completing the set merges them
+    with chunk_uploads_lock:
+        upload = chunk_uploads.get(upload_id)
+        if upload is None and len(chunk_uploads) < config.MAX_ACTIVE_CHUNK_UPLOADS:
+            upload = chunk_uploads[upload_id] = {
+                'parts': set(), 'bytes': 0, 'rejected': False, 'merging': False, 'updated': 0.0
+            }
+        if upload is not None:
+            upload['updated'] = time.monotonic()
+    
+    if upload is None:
+        os.remove(received_path)
+        logger.warning(f"Too many chunked uploads in progress, rejected upload: {upload_id}")
+        return jsonify({'error': 'Too many uploads in progress, please try again later'}), 503
+    
+    with chunk_uploads_lock:
+        if not upload['rejected'] and chunk_index not in upload['parts']:
+            upload['parts'].add(chunk_index)
+            upload['bytes'] += part_size
+            # Each part passes MAX_CONTENT_LENGTH on its own; the assembled file must too
+            upload['rejected'] = upload['bytes'] > app.config['MAX_CONTENT_LENGTH']
+            if not upload['rejected']:
+                os.replace(received_path, part_path)
+        
+        # A rejected upload stays marked so parts still in flight are discarded too
+        stale_parts = (upload['parts'] | {chunk_index}) if upload['rejected'] else ()
+        if upload['rejected']:
+            upload['parts'].clear()
+        received = len(upload['parts'])
+        complete = not upload['rejected'] and not upload['merging'] and received == total_chunks
+        # Stays tracked while merging, so the expiry sweep leaves its parts alone
+        upload['merging'] = upload['merging'] or complete
+    
+    # Left behind if the part was a duplicate or the upload was rejected
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(received_path)
+    
+    if stale_parts:
+        for index in stale_parts:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(chunk_part_path(upload_id, index))
+        return upload_too_large()
+    
+    if not complete:
+        return jsonify({
+            'upload_id': upload_id,
+            'chunk_index': chunk_index,
+            'received': received
+        })
+    
+    task_id = secrets.token_urlsafe(12)
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{task_id}_{original_filename}")
+    try:
+        # The first part holds the container header; reject before merging
+        with open(chunk_part_path(upload_id, 0), 'rb') as first_part:
+            header = first_part.read(MAGIC_HEADER_SIZE)
+        if not validate_file_magic(header):
+            for index in range(total_chunks):
+                os.remove(chunk_part_path(upload_id, index))
+            logger.warning(f"Magic number validation failed for file: {original_filename}")
+            return jsonify({'error': magic_error(original_filename)}), 400
+        
+        merge_chunks(upload_id, total_chunks, input_path)
+        error = enqueue_video(task_id, original_filename, input_path, options)
+    except Exception as e:
+        logger.error(f"Error merging chunked upload {upload_id}: {e}", exc_info=True)
+        if os.path.exists(input_path):
+            os.remove(input_path)
+        return jsonify({'error': f'{original_filename}: Upload failed - {str(e)}'}), 500
+    finally:
+        with chunk_uploads_lock:
+            del chunk_uploads[upload_id]
+    
+    if error:
+        return jsonify({'error': error}), 400
+    
+    return jsonify({
+        'message': 'Successfully uploaded 1 file(s)',
+        'files': [{'task_id': task_id, 'filename': original_filename}]
+    })
+
+@app.errorhandler(413)
+def upload_too_large(error=None):
+    """JSON body for uploads over MAX_CONTENT_LENGTH, which the UI expects"""
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'File too large (max {limit_mb}MB)'}), 413
+
 @app.route('/status/<task_id>')
 def get_status(task_id):
+    """
+    Polling fallback for clients without SocketIO (deprecated)
+    
+    The ETag covers status and progress, so a poll between progress steps
+    is answered with an empty 304 instead of re-encoding the same body.
+    """
     status = processing_status.get(task_id, {'status': 'unknown', 'progress': 0, 'message': 'Task not found'})
-    return jsonify(status)
+    etag = f'{status["status"]}-{status["progress"]}'
+    
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(status)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-store, max-age=0'
+    response.headers['Deprecation'] = 'true'
+    return response
+
+@app.route('/events/<task_id>')
+def task_events(task_id):
+    """
+    Server-Sent Events stream of one task's status
+    
+    A lighter alternative to SocketIO for clients that only need progress.
+    Slow readers get the latest status, never a backlog; the stream ends
+    once the task completes or fails.
+    """
+    updates = Queue(maxsize=1)
+    with event_subscribers_lock:
+        event_subscribers.setdefault(task_id, set()).add(updates)
+    
+    def unsubscribe():
+        with event_subscribers_lock:
+            listeners = event_subscribers.get(task_id)
+            if listeners is not None:
+                listeners.discard(updates)
+                if not listeners:
+                    del event_subscribers[task_id]
+    
+    # Subscribed first, so a transition between here and the stream is not lost
+    status = processing_status.get(task_id)
+    if status is None:
+        unsubscribe()
+        return jsonify({'error': 'Task not found'}), 404
+    
+    def stream(status):
+        try:
+            while True:
+                if status is None:
+                    yield b': keep-alive\n\n'
+                else:
+                    yield b'data: ' + orjson.dumps(status) + b'\n\n'
+                    if status['status'] in StatusStore.TERMINAL_STATES:
+                        return
+                try:
+                    status = updates.get(timeout=config.SSE_KEEPALIVE_INTERVAL)
+                except Empty:
+                    status = None
+        finally:
+            unsubscribe()
+    
+    return Response(stream(status), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'  # let nginx pass events through unbuffered
+    })
 
 @app.route('/files')
 def list_files():
-    files = []
-    for file_id, file_info in file_registry.items():
-        files.append({
-            'id': file_id,
-            'original_filename': file_info['original_filename'],
-            'processed_date': file_info['processed_date'],
-            'file_size': file_info['file_size']
-        })
-    
-    # Sort by processed date (newest first)
-    files.sort(key=lambda x: x['processed_date'], reverse=True)
-    return jsonify(files)
+    limit = request.args.get('limit', type=int)
+    return jsonify(file_registry.list_recent(limit))
 
 @app.route('/download/<file_id>')
 def download_file(file_id):
-    if file_id not in file_registry:
+    file_info = file_registry.get(file_id)
+    if file_info is None:
         return jsonify({'error': 'File not found'}), 404
     
-    file_info = file_registry[file_id]
     file_path = os.path.join(app.config['PROCESSED_FOLDER'], file_info['processed_filename'])
     
-    if not os.path.exists(file_path):
+    try:
+        mtime = os.stat(file_path).st_mtime
+    except FileNotFoundError:
         return jsonify({'error': 'File not found on disk'}), 404
     
-    return send_file(file_path, as_attachment=True, download_name=f"watermarked_{file_info['original_filename']}")
+    download_name = f"watermarked_{file_info['original_filename']}"
+    
+    if config.X_ACCEL_REDIRECT:
+        # nginx serves the bytes from its internal location; we only send headers
+        response = Response(mimetype='application/octet-stream')
+        response.headers['X-Accel-Redirect'] = config.X_ACCEL_PREFIX + quote(file_info['processed_filename'])
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
+    
+    # Conditional responses let browsers resume (Range) and revalidate (ETag)
+    return send_file(
+        file_path, as_attachment=True, download_name=download_name,
+        conditional=True, etag=True, last_modified=mtime
+    )
 
 @app.route('/delete/<file_id>', methods=['DELETE'])
 def delete_file(file_id):
-    if file_id not in file_registry:
+    file_info = file_registry.get(file_id)
+    if file_info is None:
         return jsonify({'error': 'File not found'}), 404
     
-    file_info = file_registry[file_id]
     file_path = os.path.join(app.config['PROCESSED_FOLDER'], file_info['processed_filename'])
     
     # Remove file from disk
@@ -407,19 +1014,19 @@ def delete_file(file_id):
         os.remove(file_path)
     
     # Remove from registry
-    del file_registry[file_id]
-    save_file_registry()
+    file_registry.delete(file_id)
     
     return jsonify({'message': 'File deleted successfully'})
 
 @app.route('/queue/status')
 def get_queue_status():
     """Get current processing queue status"""
+    counts = processing_status.counts()
     return jsonify({
-        'queue_size': processing_queue.qsize(),
-        'active_tasks': len([s for s in processing_status.values() if s['status'] == 'processing']),
-        'completed_tasks': len([s for s in processing_status.values() if s['status'] == 'completed']),
-        'failed_tasks': len([s for s in processing_status.values() if s['status'] == 'error'])
+        'queue_size': counts['queued'],
+        'active_tasks': counts['processing'],
+        'completed_tasks': counts['completed'],
+        'failed_tasks': counts['error']
     })
 
 @app.route('/system/info')
@@ -427,9 +1034,10 @@ def get_system_info():
     """Get system information for monitoring"""
     
     try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        snapshot = get_system_snapshot()
+        cpu_percent = snapshot['cpu_percent']
+        memory = snapshot['memory']
+        disk = snapshot['disk']
         
         return jsonify({
             'system': {
@@ -446,8 +1054,8 @@ def get_system_info():
             'app': {
                 'version': config.VERSION,
                 'debug': config.DEBUG,
-                'max_file_size': MAX_CONTENT_LENGTH,
-                'allowed_extensions': list(ALLOWED_EXTENSIONS)
+                'max_file_size': config.MAX_CONTENT_LENGTH,
+                'allowed_extensions': config.ALLOWED_EXTENSIONS
             }
         })
     except ImportError:
@@ -456,8 +1064,8 @@ def get_system_info():
             'app': {
                 'version': config.VERSION,
                 'debug': config.DEBUG,
-                'max_file_size': MAX_CONTENT_LENGTH,
-                'allowed_extensions': list(ALLOWED_EXTENSIONS)
+                'max_file_size': config.MAX_CONTENT_LENGTH,
+                'allowed_extensions': config.ALLOWED_EXTENSIONS
             }
         })
 
@@ -488,26 +1096,24 @@ def extract_watermark():
     if not allowed_file(file.filename):
         return jsonify({'error': 'File type not supported'}), 400
     
+    temp_path = None
     try:
-        # Generate unique filename
-        extract_id = str(uuid.uuid4())
-        filename = f"{extract_id}_{secure_filename(file.filename)}"
-        
         # Save uploaded file temporarily
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(temp_path)
+        temp_path = save_temp_video(file)
+        if temp_path is None:
+            return jsonify({'error': 'Invalid video file'}), 400
         
         # Validate video file
-        processor = VideoProcessor()
-        if not processor.validate_video_file(temp_path):
+        if not run_blocking(video_processor.validate_video_file, temp_path):
             os.remove(temp_path)
             return jsonify({'error': 'Invalid video file'}), 400
         
         # Extract watermark
-        watermarker = DCTWatermark()
-        extracted_text = processor.extract_watermark_from_video(
-            temp_path, watermark_length, watermarker
-        )
+        with borrow_watermarker() as watermarker:
+            extracted_text = run_blocking(
+                video_processor.extract_watermark_from_video,
+                temp_path, watermark_length, watermarker
+            )
         
         # Clean up temporary file
         os.remove(temp_path)
@@ -527,7 +1133,7 @@ def extract_watermark():
     except Exception as e:
         logger.error(f"Error extracting watermark: {e}", exc_info=True)
         # Clean up on error
-        if 'temp_path' in locals() and os.path.exists(temp_path):
+        if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
         return jsonify({'error': f'Extraction failed: {str(e)}'}), 500
 
@@ -543,16 +1149,16 @@ def validate_video():
     if not file or file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    temp_path = None
     try:
-        # Save file temporarily for validation
-        temp_id = str(uuid.uuid4())
+        # Saved in full even if the type looks wrong: the report explains why
+        temp_id = secrets.token_urlsafe(12)
         filename = f"validate_{temp_id}_{secure_filename(file.filename)}"
         temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(temp_path)
+        save_upload(file, temp_path)
         
         # Perform comprehensive validation
-        processor = VideoProcessor()
-        validation_result = processor.validate_video_comprehensive(temp_path)
+        validation_result = run_blocking(video_processor.validate_video_comprehensive, temp_path)
         
         # Clean up temporary file
         os.remove(temp_path)
@@ -561,7 +1167,7 @@ def validate_video():
     
     except Exception as e:
         logger.error(f"Error validating video: {e}", exc_info=True)
-        if 'temp_path' in locals() and os.path.exists(temp_path):
+        if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
         return jsonify({'error': f'Validation failed: {str(e)}'}), 500
 
@@ -578,19 +1184,18 @@ def estimate_processing_time():
     if not file or file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    temp_path = None
     try:
         # Save file temporarily for analysis
-        temp_id = str(uuid.uuid4())
-        filename = f"estimate_{temp_id}_{secure_filename(file.filename)}"
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(temp_path)
+        temp_path = save_temp_video(file, prefix='estimate_')
+        if temp_path is None:
+            return jsonify({'error': 'Invalid video file'}), 400
         
         # Get processing time estimate
-        processor = VideoProcessor()
-        estimate = processor.estimate_processing_time(temp_path, watermark_text)
+        estimate = run_blocking(video_processor.estimate_processing_time, temp_path, watermark_text)
         
         # Get video info for additional context
-        video_info = processor.get_video_info(temp_path)
+        video_info = run_blocking(video_processor.get_video_info, temp_path)
         
         # Clean up temporary file
         os.remove(temp_path)
@@ -602,7 +1207,7 @@ def estimate_processing_time():
     
     except Exception as e:
         logger.error(f"Error estimating processing time: {e}", exc_info=True)
-        if 'temp_path' in locals() and os.path.exists(temp_path):
+        if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
         return jsonify({'error': f'Estimation failed: {str(e)}'}), 500
 
@@ -610,14 +1215,15 @@ def estimate_processing_time():
 def get_batch_status():
     """Get status of all batch processing tasks"""
     try:
+        counts = processing_status.counts()
         batch_stats = {
-            'total_tasks': len(processing_status),
-            'queued': len([s for s in processing_status.values() if s['status'] == 'queued']),
-            'processing': len([s for s in processing_status.values() if s['status'] == 'processing']),
-            'completed': len([s for s in processing_status.values() if s['status'] == 'completed']),
-            'failed': len([s for s in processing_status.values() if s['status'] == 'error']),
-            'queue_size': processing_queue.qsize(),
-            'tasks': list(processing_status.values())[:10]  # Return latest 10 tasks
+            'total_tasks': sum(counts.values()),
+            'queued': counts['queued'],
+            'processing': counts['processing'],
+            'completed': counts['completed'],
+            'failed': counts['error'],
+            'queue_size': counts['queued'],
+            'tasks': processing_status.recent(10)  # Return latest 10 tasks
         }
         
         return jsonify(batch_stats)
@@ -631,35 +1237,38 @@ def get_batch_status():
 def get_metrics():
     """Get application metrics for monitoring"""
     try:
+        total_files = len(file_registry)
+        
         # Processing metrics
         processing_metrics = {
-            'total_files_processed': len(file_registry),
-            'active_processes': len([s for s in processing_status.values() if s['status'] == 'processing']),
-            'queue_length': processing_queue.qsize(),
+            'total_files_processed': total_files,
+            'active_processes': processing_status.count('processing'),
+            'queue_length': get_queue_size(),
             'success_rate': 0
         }
         
         # Calculate success rate
-        if processing_status:
-            successful = len([s for s in processing_status.values() if s['status'] == 'completed'])
-            total = len(processing_status)
+        counts = processing_status.counts()
+        total = sum(counts.values())
+        if total:
+            successful = counts['completed']
             processing_metrics['success_rate'] = round((successful / total) * 100, 2)
         
         # Storage metrics
-        processed_files = list(file_registry.values())
-        total_size = sum(f.get('file_size', 0) for f in processed_files)
+        total_size = file_registry.total_size()
         
         storage_metrics = {
-            'total_processed_files': len(processed_files),
+            'total_processed_files': total_files,
             'total_storage_mb': round(total_size / (1024 * 1024), 2),
-            'average_file_size_mb': round((total_size / len(processed_files)) / (1024 * 1024), 2) if processed_files else 0
+            'average_file_size_mb': round((total_size / total_files) / (1024 * 1024), 2) if total_files else 0
         }
         
         # System metrics (if psutil available)
         system_metrics = {}
         try:
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            memory = psutil.virtual_memory()
+            snapshot = get_system_snapshot()
+            cpu_percent = snapshot['cpu_percent']
+            memory = snapshot['memory']
             system_metrics = {
                 'cpu_usage': cpu_percent,
                 'memory_usage': memory.percent,
@@ -681,11 +1290,11 @@ def get_metrics():
 
 @socketio.on('connect')
 def handle_connect():
-    print('Client connected')
+    logger.debug('Client connected')
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print('Client disconnected')
+    logger.debug('Client disconnected')
 
 @socketio.on('join_task')
 def handle_join_task(data):
@@ -693,23 +1302,19 @@ def handle_join_task(data):
     join_room(task_id)
     
     # Send current status if available
-    if task_id in processing_status:
-        emit('processing_update', processing_status[task_id])
+    status = processing_status.get(task_id)
+    if status:
+        emit('processing_update', status)
 
 if __name__ == '__main__':
     logger.info(f"🎬 Starting {config.APP_NAME} v{config.VERSION}")
     logger.info(f"📊 Server running on http://{config.HOST}:{config.PORT}")
-    logger.info(f"📁 Upload folder: {UPLOAD_FOLDER}")
-    logger.info(f"📁 Processed folder: {PROCESSED_FOLDER}")
-    logger.info(f"📏 Max file size: {MAX_CONTENT_LENGTH // (1024*1024)}MB")
+    logger.info(f"📁 Upload folder: {config.UPLOAD_FOLDER}")
+    logger.info(f"📁 Processed folder: {config.PROCESSED_FOLDER}")
+    logger.info(f"📏 Max file size: {config.MAX_CONTENT_LENGTH // (1024*1024)}MB")
     logger.info(f"🔒 CORS origins: {cors_origins}")
+    logger.info(f"⚡ SocketIO async mode: {socketio.async_mode}")
     logger.info(f"📝 Log level: {config.LOG_LEVEL}")
     logger.info("🚀 Ready to process videos!")
     
-    print(f"🎬 Starting {config.APP_NAME} v{config.VERSION}")
-    print(f"📊 Server running on http://{config.HOST}:{config.PORT}")
-    print(f"📁 Upload folder: {UPLOAD_FOLDER}")
-    print(f"📁 Processed folder: {PROCESSED_FOLDER}")
-    print(f"📏 Max file size: {MAX_CONTENT_LENGTH // (1024*1024)}MB")
-    print("🚀 Ready to process videos!")
     socketio.run(app, debug=config.DEBUG, host=config.HOST, port=config.PORT)
@@ -3,6 +3,13 @@ import os
 import secrets
 import logging
 
+from dotenv import load_dotenv
+
+# Load .env before any setting below is read; apart from ASYNC_MODE, which
+# app.py needs before its imports, this module is the only place the
+# application reads its environment
+load_dotenv()
+
 ## Application Settings
 APP_NAME = "Open Video Watermark"
 VERSION = "1.0.0"
@@ -14,13 +21,33 @@ MAX_STRENGTH = float(os.getenv('MAX_STRENGTH', 0.3))
 BLOCK_SIZE = int(os.getenv('BLOCK_SIZE', 8))
 
 ## File Upload Settings
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+PROCESSED_FOLDER = os.getenv('PROCESSED_FOLDER', 'processed')
 ALLOWED_EXTENSIONS = ['mp4', 'avi', 'mov', 'mkv', 'wmv', 'flv', 'webm']
 MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 500))
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', MAX_FILE_SIZE_MB * 1024 * 1024))
 MAX_WATERMARK_LENGTH = int(os.getenv('MAX_WATERMARK_LENGTH', 50))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))  # bytes per copy
+MAX_UPLOAD_CHUNKS = int(os.getenv('MAX_UPLOAD_CHUNKS', 1000))  # parts per chunked upload
+MAX_CONCURRENT_MERGES = int(os.getenv('MAX_CONCURRENT_MERGES', 2))
+MAX_ACTIVE_CHUNK_UPLOADS = int(os.getenv('MAX_ACTIVE_CHUNK_UPLOADS', 100))  # chunked uploads in progress at once
+CHUNK_UPLOAD_TTL = int(os.getenv('CHUNK_UPLOAD_TTL', 3600))  # seconds before an idle chunked upload is dropped
+UPLOAD_SPOOL_SIZE = int(os.getenv('UPLOAD_SPOOL_SIZE', 8 * 1024 * 1024))  # kept in memory below this
+UPLOAD_SAVE_WORKERS = int(os.getenv('UPLOAD_SAVE_WORKERS', 4))  # files of one request saved in parallel
 
 ## Processing Settings
 PROGRESS_UPDATE_INTERVAL = int(os.getenv('PROGRESS_UPDATE_INTERVAL', 10))  # frames
+PROGRESS_BATCH_SIZE = int(os.getenv('PROGRESS_BATCH_SIZE', 64))  # reports drained per dispatcher pass
+PROGRESS_EMIT_INTERVAL = float(os.getenv('PROGRESS_EMIT_INTERVAL', 0.1))  # seconds between same-percent updates
+MAX_FRAME_STRIDE = int(os.getenv('MAX_FRAME_STRIDE', 30))  # upper bound for the frame_stride upload option
+CAPTURE_BUFFER_SIZE = int(os.getenv('CAPTURE_BUFFER_SIZE', 1))  # decoded frames buffered per capture
 FRAME_SAMPLE_RATE = int(os.getenv('FRAME_SAMPLE_RATE', 30))  # for extraction
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', 0))  # 0 = one per physical core
+WORKER_CV_THREADS = int(os.getenv('WORKER_CV_THREADS', 0))  # OpenCV threads per worker, 0 = cores / workers
+MAX_PENDING_TASKS = int(os.getenv('MAX_PENDING_TASKS', 100))  # queued + running tasks
+STATUS_TTL = int(os.getenv('STATUS_TTL', 3600))  # seconds to keep finished task statuses
+MAX_TRACKED_TASKS = int(os.getenv('MAX_TRACKED_TASKS', 10000))  # finished statuses beyond this are dropped early
+SYSTEM_INFO_CACHE_TTL = float(os.getenv('SYSTEM_INFO_CACHE_TTL', 2.0))  # seconds
 
 ## UI Settings
 DEFAULT_TAB = os.getenv('DEFAULT_TAB', "embed")
@@ -37,12 +64,27 @@ def get_secret_key():
     return secret
 
 SECRET_KEY = get_secret_key()
+# Keys the hashed client ids used for rate limiting; set per deployment
+RATE_LIMIT_SALT = os.getenv('RATE_LIMIT_SALT', 'default-salt-change-in-production')
 
 ## Development Settings
 DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 'yes', 'on')
 HOST = os.getenv('HOST', "0.0.0.0")
 PORT = int(os.getenv('PORT', 8000))
 
+## SocketIO Settings
+# Payloads above this size (bytes) are compressed on the polling transport
+SOCKETIO_COMPRESSION_THRESHOLD = int(os.getenv('SOCKETIO_COMPRESSION_THRESHOLD', 512))
+# Seconds between keep-alive comments on idle /events streams
+SSE_KEEPALIVE_INTERVAL = float(os.getenv('SSE_KEEPALIVE_INTERVAL', 15))
+
+## Download Settings
+# Hand file bodies to the front-end server instead of streaming them from Python.
+# X_ACCEL_REDIRECT is for nginx (see nginx.conf); USE_X_SENDFILE for Apache/lighttpd.
+X_ACCEL_REDIRECT = os.getenv('X_ACCEL_REDIRECT', 'False').lower() in ('true', '1', 'yes', 'on')
+X_ACCEL_PREFIX = os.getenv('X_ACCEL_PREFIX', '/protected-processed/')
+USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'False').lower() in ('true', '1', 'yes', 'on')
+
 ## CORS Settings
 CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
 
@@ -6,6 +6,220 @@ Demo script to create a sample video for testing the watermarking application
 import cv2
 import numpy as np
 import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from queue import Queue
+from functools import lru_cache
+
+try:
+    from numba import njit, prange
+except ImportError:  # without numba the NumPy path below is used instead
+    njit = None
+
+try:
+    import av
+except ImportError:  # PyAV is optional; cv2.VideoWriter is used instead
+    av = None
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _fill_gradient(frame, r_lut, g_lut, b_lut):
+        """Write the three gradient lookup tables into a BGR frame in one pass"""
+        height, width = frame.shape[:2]
+        for y in prange(height):
+            g = g_lut[y]
+            for x in range(width):
+                frame[y, x, 0] = b_lut[x + y]
+                frame[y, x, 1] = g
+                frame[y, x, 2] = r_lut[x]
+else:
+    _fill_gradient = None
+
+# Codecs tried in order for generated videos: H.264 first (hardware encoded
+# through VideoToolbox/VAAPI/NVENC when the FFmpeg build has it), then the
+# portable MPEG-4 Part 2 encoder. DEMO_VIDEO_CODEC overrides the list,
+# e.g. DEMO_VIDEO_CODEC=mp4v or DEMO_VIDEO_CODEC=avc1,mp4v
+DEFAULT_CODECS = ('avc1', 'H264', 'mp4v')
+
+# FFmpeg encoder names for the FourCC codes above, used with PyAV
+PYAV_CODECS = {'avc1': 'h264', 'H264': 'h264', 'mp4v': 'mpeg4'}
+
+class PyAVWriter:
+    """
+    cv2.VideoWriter-compatible writer that encodes through PyAV
+    
+    Packets are muxed as the encoder produces them with packet flushing
+    disabled, so the muxer batches writes and the encoder is only drained
+    once, on release().
+    """
+    
+    def __init__(self, output_path, codec, fps, width, height):
+        self.container = av.open(output_path, mode='w', options={'flush_packets': '0'})
+        try:
+            self.stream = self.container.add_stream(codec, rate=fps)
+            self.stream.width = width
+            self.stream.height = height
+            self.stream.pix_fmt = 'yuv420p'
+        except Exception:
+            self.container.close()
+            raise
+    
+    def isOpened(self):
+        return True
+    
+    def write(self, frame):
+        """Encode one BGR frame (copied, so the caller may reuse its buffer)"""
+        video_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
+        self.container.mux(self.stream.encode(video_frame))
+    
+    def release(self):
+        self.container.mux(self.stream.encode())
+        self.container.close()
+
+# Encoder arguments for an ffmpeg subprocess, for the H.264 FourCC codes
+FFMPEG_ENCODERS = {
+    'avc1': ('libx264', '-preset', 'ultrafast', '-tune', 'zerolatency'),
+    'H264': ('libx264', '-preset', 'ultrafast', '-tune', 'zerolatency'),
+}
+
+@lru_cache(maxsize=1)
+def _ffmpeg_encoders():
+    """Encoder names supported by the ffmpeg binary on PATH (empty if there is none)"""
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return frozenset()
+    try:
+        listing = subprocess.run(
+            [ffmpeg, '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return frozenset()
+    return frozenset(line.split()[1] for line in listing.splitlines() if len(line.split()) > 1)
+
+class FFmpegPipeWriter:
+    """
+    cv2.VideoWriter-compatible writer that pipes raw BGR frames to ffmpeg
+    
+    One ffmpeg process encodes the whole video; frames go through a large
+    buffered stdin, so write() rarely blocks on the encoder.
+    """
+    
+    PIPE_BUFFER = 10 * 1024 * 1024
+    
+    def __init__(self, output_path, encoder_args, fps, width, height):
+        command = [
+            shutil.which('ffmpeg'), '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-', '-c:v', *encoder_args, '-pix_fmt', 'yuv420p', output_path
+        ]
+        # stderr goes to a file rather than a pipe, which nothing drains while
+        # frames are written and could fill up and stall ffmpeg
+        self.stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.stderr,
+                                     bufsize=self.PIPE_BUFFER)
+    
+    def isOpened(self):
+        return self.proc.poll() is None
+    
+    def write(self, frame):
+        """Queue one BGR frame (copied, so the caller may reuse its buffer)"""
+        self.proc.stdin.write(frame.data)
+    
+    def release(self):
+        """Wait for ffmpeg to finish; raises RuntimeError with its stderr if it failed"""
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass  # ffmpeg already exited; its status says why
+        with self.stderr:
+            if self.proc.wait() != 0:
+                self.stderr.seek(0)
+                message = self.stderr.read().decode(errors='replace').strip()
+                raise RuntimeError(f"ffmpeg exited with status {self.proc.returncode}: {message}")
+
+def open_video_writer(output_path, fps, width, height):
+    """
+    Open a writer with the first codec this build can encode
+    
+    PyAV is preferred when installed, then an ffmpeg subprocess for H.264,
+    then cv2.VideoWriter.
+    
+    Returns:
+        Tuple of (writer, codec), or (None, None) if no codec could be opened
+    """
+    codecs = os.getenv('DEMO_VIDEO_CODEC')
+    codecs = [c.strip() for c in codecs.split(',') if c.strip()] if codecs else DEFAULT_CODECS
+    
+    for codec in codecs:
+        if av is not None and codec in PYAV_CODECS:
+            try:
+                return PyAVWriter(output_path, PYAV_CODECS[codec], fps, width, height), codec
+            except (av.FFmpegError, ValueError):
+                pass
+        encoder_args = FFMPEG_ENCODERS.get(codec)
+        if encoder_args and encoder_args[0] in _ffmpeg_encoders():
+            return FFmpegPipeWriter(output_path, encoder_args, fps, width, height), codec
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+        if out.isOpened():
+            return out, codec
+        out.release()
+    return None, None
+
+# Frame buffers shared between the generating loop and the writer thread
+FRAME_BUFFERS = 4
+
+def _write_frames(out, filled, free, errors):
+    """Writer thread: encode frames from `filled`, then hand each buffer back on `free`"""
+    while True:
+        frame = filled.get()
+        if frame is None:
+            return
+        if not errors:
+            try:
+                out.write(frame)
+            except Exception as e:
+                # Keep recycling buffers so the generating loop never blocks
+                errors.append(e)
+        free.put(frame)
+
+# Gradient waves come from a table instead of per-frame trig: phases are
+# fixed point with 2**32 units per turn, and the top SINE_TABLE_BITS bits
+# select an entry already scaled to 0..255
+PHASE_TURN = 1 << 32
+SINE_TABLE_BITS = 12
+SINE_TABLE = (128 + 127 * np.sin(
+    np.arange(1 << SINE_TABLE_BITS) * (2 * np.pi / (1 << SINE_TABLE_BITS))
+)).astype(np.uint8)
+
+def _fixed_phase(radians):
+    """Angle(s) in radians as fixed-point phase units"""
+    return np.round(np.multiply(radians, PHASE_TURN / (2 * np.pi))).astype(np.int64)
+
+@lru_cache(maxsize=8)
+def _phase_tables(width, height):
+    """
+    Fixed-point gradient phase tables for one frame size, shared by every video of that size
+    
+    r is sin along x, g is cos (sin a quarter turn ahead) along y and b is
+    sin along x + y, so every channel is a 1-D lookup table per frame.
+    """
+    tables = (
+        _fixed_phase(np.arange(width) * 0.01),
+        _fixed_phase(np.arange(height) * 0.01) + PHASE_TURN // 4,
+        _fixed_phase(np.arange(width + height - 1) * 0.005)
+    )
+    for table in tables:
+        table.flags.writeable = False
+    return tables
+
+@lru_cache(maxsize=8)
+def _diagonal_index(width, height):
+    """x + y for every pixel; only the NumPy fill path needs it"""
+    index = np.add.outer(np.arange(height), np.arange(width))
+    index.flags.writeable = False
+    return index
 
 def create_demo_video(output_path="demo_video.mp4", duration=10, fps=30, width=640, height=480):
     """Create a colorful demo video with moving elements"""
@@ -14,29 +228,71 @@ def create_demo_video(output_path="demo_video.mp4", duration=10, fps=30, width=6
     print(f"Duration: {duration}s, FPS: {fps}, Resolution: {width}x{height}")
     
     # Initialize video writer
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    out, codec = open_video_writer(output_path, fps, width, height)
     
-    if not out.isOpened():
+    if out is None:
         print("Error: Could not open video writer")
         return False
+    print(f"Codec: {codec}")
     
     total_frames = duration * fps
     
+    x_phase, y_phase, diag_phase = _phase_tables(width, height)
+    diag_index = _diagonal_index(width, height) if _fill_gradient is None else None
+    
+    # Scratch tables and frame buffers are reused by every frame: the
+    # gradient overwrites each pixel, so nothing needs clearing in between
+    gradients = [
+        (table, np.empty(table.shape, dtype=np.int64), np.empty(table.shape, dtype=np.uint8))
+        for table in (x_phase, y_phase, diag_phase)
+    ]
+    r_lut, g_lut, b_lut = (lut for _, _, lut in gradients)
+    table_shift = 32 - SINE_TABLE_BITS
+    
+    # Frames are encoded on a writer thread while the next ones are drawn;
+    # a small pool of buffers cycles between the two (OpenCV and the
+    # encoders release the GIL, so both sides make progress)
+    free = Queue()
+    filled = Queue()
+    for _ in range(FRAME_BUFFERS):
+        free.put(np.empty((height, width, 3), dtype=np.uint8))
+    errors = []
+    writer = threading.Thread(target=_write_frames, args=(out, filled, free, errors), daemon=True)
+    writer.start()
+    
+    # Overlay geometry is the same in every frame
+    bar_width = width - 100
+    bar_height = 20
+    bar_x = 50
+    bar_y = height - 60
+    bar_bottom = bar_y + bar_height
+    circle_y = height // 2
+    
+    # Rotating rectangle: center and size, plus a reused corner buffer
+    rect_center = (width - 100, 100)
+    rect_size = (60, 40)
+    rotated_pts = np.empty((4, 2), dtype=np.int32)
+    
     for i in range(total_frames):
-        # Create frame with gradient background
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        frame = free.get()
         
         # Create animated gradient
         progress = i / total_frames
+        phase = progress * 2 * np.pi
         
-        # RGB gradient that changes over time
-        for y in range(height):
-            for x in range(width):
-                r = int(128 + 127 * np.sin(progress * 2 * np.pi + x * 0.01))
-                g = int(128 + 127 * np.cos(progress * 2 * np.pi + y * 0.01))
-                b = int(128 + 127 * np.sin(progress * 2 * np.pi + (x + y) * 0.005))
-                frame[y, x] = [b, g, r]  # BGR format
+        # RGB gradient that changes over time (BGR format)
+        frame_phase = int(_fixed_phase(phase))
+        for phase_table, index, lut in gradients:
+            np.add(phase_table, frame_phase, out=index)
+            np.right_shift(index, table_shift, out=index)
+            np.take(SINE_TABLE, index, out=lut, mode='wrap')
+        
+        if _fill_gradient is not None:
+            _fill_gradient(frame, r_lut, g_lut, b_lut)
+        else:
+            frame[:, :, 2] = r_lut
+            frame[:, :, 1] = g_lut[:, None]
+            np.take(b_lut, diag_index, out=frame[:, :, 0], mode='clip')
         
         # Add title
         cv2.putText(frame, 'Open Video Watermark Demo', (50, 50), 
@@ -46,64 +302,47 @@ def create_demo_video(output_path="demo_video.mp4", duration=10, fps=30, width=6
         cv2.putText(frame, f'Frame: {i+1}/{total_frames}', (50, height - 100), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2, cv2.LINE_AA)
         
-        # Add progress bar
-        bar_width = width - 100
-        bar_height = 20
-        bar_x = 50
-        bar_y = height - 60
-        
-        # Background bar
-        cv2.rectangle(frame, (bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height), 
+        # Add progress bar: background bar, then progress
+        cv2.rectangle(frame, (bar_x, bar_y), (bar_x + bar_width, bar_bottom), 
                      (100, 100, 100), -1)
-        
-        # Progress bar
         progress_width = int(bar_width * progress)
-        cv2.rectangle(frame, (bar_x, bar_y), (bar_x + progress_width, bar_y + bar_height), 
+        cv2.rectangle(frame, (bar_x, bar_y), (bar_x + progress_width, bar_bottom), 
                      (0, 255, 0), -1)
         
         # Add moving circle
         circle_x = int(50 + (width - 100) * progress)
-        circle_y = height // 2
         cv2.circle(frame, (circle_x, circle_y), 30, (255, 255, 0), -1)
         cv2.circle(frame, (circle_x, circle_y), 30, (0, 0, 255), 3)
         
         # Add rotating rectangle
-        center = (width - 100, 100)
         angle = progress * 360 * 4  # 4 full rotations
-        rect_size = (60, 40)
-        
-        # Calculate rectangle points
-        cos_a = np.cos(np.radians(angle))
-        sin_a = np.sin(np.radians(angle))
-        
-        w, h = rect_size[0] // 2, rect_size[1] // 2
-        pts = np.array([
-            [-w, -h], [w, -h], [w, h], [-w, h]
-        ], dtype=np.float32)
         
-        # Rotate points
-        rotated_pts = []
-        for pt in pts:
-            x = pt[0] * cos_a - pt[1] * sin_a + center[0]
-            y = pt[0] * sin_a + pt[1] * cos_a + center[1]
-            rotated_pts.append([int(x), int(y)])
-        
-        rotated_pts = np.array(rotated_pts, dtype=np.int32)
+        # OpenCV computes the rotated corners in C
+        np.copyto(rotated_pts, cv2.boxPoints((rect_center, rect_size, angle)), casting='unsafe')
         cv2.fillPoly(frame, [rotated_pts], (255, 0, 255))
         
-        # Write frame
-        out.write(frame)
+        # Hand the frame to the writer thread
+        filled.put(frame)
         
         # Show progress
         if (i + 1) % (fps // 2) == 0:  # Update every 0.5 seconds
             print(f"Progress: {i+1}/{total_frames} frames ({100*progress:.1f}%)")
     
-    # Release video writer
+    # Let the writer finish, then release video writer
+    filled.put(None)
+    writer.join()
     out.release()
+    if errors:
+        raise errors[0]
     
     # Verify file was created
-    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-        file_size = os.path.getsize(output_path) / (1024 * 1024)  # MB
+    try:
+        output_size = os.stat(output_path).st_size
+    except FileNotFoundError:
+        output_size = 0
+    
+    if output_size > 0:
+        file_size = output_size / (1024 * 1024)  # MB
         print(f"✅ Demo video created successfully!")
         print(f"📁 File: {output_path}")
         print(f"📏 Size: {file_size:.2f} MB")
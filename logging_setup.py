@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Logging configuration for Open Video Watermark
+The web process logs through a QueueHandler so request handlers never
+block on stdout or the log file; a background listener does the writes.
+"""
+
+import os
+import queue
+import atexit
+import logging
+import logging.handlers
+
+import config
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+FORMATTER = logging.Formatter(LOG_FORMAT)
+
+# Access-log lines for endpoints the UI polls continuously
+QUIET_PATHS = ('/status/', '/queue/status', '/socket.io/')
+
+class QuietPollingFilter(logging.Filter):
+    """Drop werkzeug access-log records for polling endpoints"""
+
+    def filter(self, record):
+        message = record.getMessage()
+        return not any(path in message for path in QUIET_PATHS)
+
+def _build_handlers():
+    """File and console handlers with the application format"""
+    log_dir = os.path.dirname(config.LOG_FILE)
+    if log_dir and not os.path.exists(log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+
+    handlers = [logging.FileHandler(config.LOG_FILE), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(FORMATTER)
+    return handlers
+
+def setup_logging():
+    """
+    Route all log records through an in-memory queue
+
+    Returns:
+        The started QueueListener (stopped automatically at exit)
+    """
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(
+        log_queue, *_build_handlers(), respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(getattr(logging, config.LOG_LEVEL, logging.INFO))
+
+    logging.getLogger('werkzeug').addFilter(QuietPollingFilter())
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+def setup_worker_logging():
+    """
+    Log directly from a pool process
+
+    A forked worker inherits the QueueHandler but not the listener thread,
+    so records would pile up unwritten; workers write synchronously instead.
+    """
+    logging.basicConfig(
+        level=getattr(logging, config.LOG_LEVEL, logging.INFO),
+        handlers=_build_handlers(),
+        force=True
+    )
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Processed file registry for Open Video Watermark
+Stores metadata for watermarked videos in SQLite (WAL mode) so each
+mutation is a single row write instead of a full JSON rewrite.
+"""
+
+import os
+import orjson
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FileRegistry:
+    """SQLite-backed registry of processed files"""
+
+    COLUMNS = (
+        'id', 'original_filename', 'processed_filename', 'watermark_text',
+        'strength', 'processed_date', 'file_size'
+    )
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        # (count, total size) from the last aggregate query; reset by every write
+        self._stats = None
+        self._generation = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'id TEXT PRIMARY KEY, original_filename TEXT, processed_filename TEXT, '
+            'watermark_text TEXT, strength REAL, processed_date TEXT, file_size INTEGER)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_date ON files(processed_date DESC)')
+        self._migrate_json_registry()
+
+    def _migrate_json_registry(self):
+        """Import entries from the legacy registry.json, if present"""
+        json_path = os.path.join(os.path.dirname(self.db_path), 'registry.json')
+        if not os.path.exists(json_path):
+            return
+
+        try:
+            with open(json_path, 'rb') as f:
+                entries = orjson.loads(f.read())
+            self.add_many(entries.values())
+            os.replace(json_path, json_path + '.migrated')
+            logger.info(f"Migrated {len(entries)} entries from {json_path}")
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not migrate legacy registry {json_path}: {e}")
+
+    _INSERT = (
+        f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNS))})"
+    )
+
+    def add(self, file_info: dict):
+        """Insert or replace a processed file entry"""
+        values = tuple(file_info.get(column) for column in self.COLUMNS)
+        with self._write_lock:
+            self._conn.execute(self._INSERT, values)
+            self._invalidate_stats()
+
+    def add_many(self, entries):
+        """Insert or replace several entries in a single transaction"""
+        rows = [tuple(file_info.get(column) for column in self.COLUMNS) for file_info in entries]
+        with self._write_lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(self._INSERT, rows)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            self._invalidate_stats()
+
+    def _invalidate_stats(self):
+        """Drop cached aggregates after a write (write lock must be held)"""
+        self._stats = None
+        self._generation += 1
+
+    def get(self, file_id: str):
+        """Return the entry for file_id as a dict, or None"""
+        row = self._conn.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, file_id: str) -> bool:
+        """Remove an entry; returns True if it existed"""
+        with self._write_lock:
+            cursor = self._conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+            self._invalidate_stats()
+        return cursor.rowcount > 0
+
+    def list_recent(self, limit: int = None) -> list:
+        """Return entries newest first (all entries when limit is None)"""
+        rows = self._conn.execute(
+            'SELECT id, original_filename, processed_date, file_size FROM files '
+            'ORDER BY processed_date DESC LIMIT ?',
+            (limit if limit is not None else -1,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _aggregate(self):
+        """
+        Entry count and total size, scanning the table only after a write
+        
+        Monitoring endpoints poll these far more often than files change.
+        """
+        stats = self._stats
+        if stats is None:
+            generation = self._generation
+            stats = tuple(self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(file_size), 0) FROM files'
+            ).fetchone())
+            with self._write_lock:
+                # Keep it only if no write happened while we were counting
+                if generation == self._generation:
+                    self._stats = stats
+        return stats
+
+    def total_size(self) -> int:
+        """Total size in bytes of all processed files"""
+        return self._aggregate()[1]
+
+    def __len__(self):
+        return self._aggregate()[0]
+
+    def __contains__(self, file_id):
+        return self._conn.execute('SELECT 1 FROM files WHERE id = ?', (file_id,)).fetchone() is not None
@@ -6,23 +6,56 @@ Implements rate limiting, security headers, and production safety features.
 
 import time
 import hashlib
-from collections import defaultdict, deque
-from functools import wraps
+import threading
+from functools import wraps, lru_cache
 from flask import request, jsonify, current_app
 import logging
 from datetime import datetime, timedelta
 import re
 import os
 
+import config
+
 logger = logging.getLogger(__name__)
 
+# Built once at import instead of on every validation call
+DANGEROUS_EXTENSIONS = frozenset({
+    'exe', 'bat', 'cmd', 'com', 'pif', 'scr', 'vbs', 'js', 'jar',
+    'msi', 'dll', 'sh', 'py', 'php', 'jsp', 'asp', 'aspx'
+})
+VIDEO_EXTENSIONS = frozenset({'mp4', 'avi', 'mov', 'mkv', 'wmv', 'flv', 'webm'})
+UNSUPPORTED_TYPE_ERROR = f"File type not supported (allowed: {', '.join(sorted(VIDEO_EXTENSIONS))})"
+
+# '..', path separators, and control characters other than tab, newline and carriage return
+UNSAFE_FILENAME_RE = re.compile(r'\.\.|[/\\\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# str.translate table deleting control characters other than tab, newline and carriage return
+CONTROL_CHARS_TABLE = dict.fromkeys(i for i in range(32) if chr(i) not in '\t\n\r')
+
+def _extension(filename: str) -> str:
+    """Lowercase extension without the dot, or '' if there is none"""
+    return filename.rpartition('.')[2].lower() if '.' in filename else ''
+
 class RateLimiter:
-    """Simple in-memory rate limiter"""
+    """
+    Simple in-memory sliding-window rate limiter
+    
+    Each (client, limit, window) keeps a ring of its last `limit` accepted
+    request times, so a check is O(1) however busy the client is: the
+    request is allowed when the oldest slot has left the window.
+    
+    Clients are spread over lock-protected shards so concurrent requests
+    from different clients rarely wait on each other. Limits are per
+    process; a multi-process deployment enforces them per worker.
+    """
+    
+    SHARDS = 16
     
     def __init__(self):
-        self.clients = defaultdict(deque)
+        # Per shard: (client_id, limit, window) -> [head index, ring of timestamps]
+        self.shards = [({}, threading.Lock()) for _ in range(self.SHARDS)]
         self.cleanup_interval = 300  # 5 minutes
-        self.last_cleanup = time.time()
+        self.last_cleanup = time.monotonic()
     
     def is_allowed(self, client_id: str, limit: int, window: int) -> bool:
         """
@@ -36,45 +69,46 @@ class RateLimiter:
         Returns:
             True if request is allowed, False if rate limited
         """
-        now = time.time()
+        now = time.monotonic()
         
         # Cleanup old entries periodically
         if now - self.last_cleanup > self.cleanup_interval:
             self._cleanup()
             self.last_cleanup = now
         
-        # Get client's request history
-        client_requests = self.clients[client_id]
-        
-        # Remove requests outside the window
-        while client_requests and client_requests[0] < now - window:
-            client_requests.popleft()
-        
-        # Check if under limit
-        if len(client_requests) < limit:
-            client_requests.append(now)
+        key = (client_id, limit, window)
+        clients, lock = self.shards[hash(client_id) % self.SHARDS]
+        with lock:
+            entry = clients.get(key)
+            if entry is None:
+                entry = clients[key] = [0, [float('-inf')] * limit]
+            head, stamps = entry
+            
+            # The slot about to be reused holds the oldest of the last `limit` requests
+            if stamps[head] >= now - window:
+                return False
+            
+            stamps[head] = now
+            entry[0] = (head + 1) % limit
             return True
-        
-        return False
     
     def _cleanup(self):
         """Remove old client entries to prevent memory bloat"""
-        now = time.time()
-        clients_to_remove = []
-        
-        for client_id, requests in self.clients.items():
-            # Remove requests older than 1 hour
-            while requests and requests[0] < now - 3600:
-                requests.popleft()
-            
-            # Remove clients with no recent requests
-            if not requests:
-                clients_to_remove.append(client_id)
+        cutoff = time.monotonic() - 3600
+        removed = 0
         
-        for client_id in clients_to_remove:
-            del self.clients[client_id]
+        # Drop clients whose latest request is more than 1 hour old
+        for clients, lock in self.shards:
+            with lock:
+                clients_to_remove = [
+                    key for key, (head, stamps) in clients.items()
+                    if stamps[head - 1] < cutoff
+                ]
+                for key in clients_to_remove:
+                    del clients[key]
+            removed += len(clients_to_remove)
         
-        logger.debug(f"Rate limiter cleanup: removed {len(clients_to_remove)} inactive clients")
+        logger.debug("Rate limiter cleanup: removed %d inactive clients", removed)
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
@@ -157,36 +191,15 @@ def validate_filename(filename: str) -> bool:
     Returns:
         True if filename is safe, False otherwise
     """
-    if not filename:
-        return False
-    
-    # Check for path traversal attempts
-    if '..' in filename or '/' in filename or '\\' in filename:
+    if not filename or len(filename) > 255:
         return False
     
-    # Check for null bytes
-    if '\x00' in filename:
+    # Path traversal, null bytes and control characters in a single scan
+    if UNSAFE_FILENAME_RE.search(filename):
         return False
     
     # Check for suspicious extensions
-    dangerous_extensions = {
-        'exe', 'bat', 'cmd', 'com', 'pif', 'scr', 'vbs', 'js', 'jar',
-        'msi', 'dll', 'sh', 'py', 'php', 'jsp', 'asp', 'aspx'
-    }
-    
-    ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    if ext in dangerous_extensions:
-        return False
-    
-    # Check filename length
-    if len(filename) > 255:
-        return False
-    
-    # Check for control characters
-    if any(ord(c) < 32 and c not in '\t\n\r' for c in filename):
-        return False
-    
-    return True
+    return _extension(filename) not in DANGEROUS_EXTENSIONS
 
 def sanitize_input(text: str, max_length: int = None) -> str:
     """
@@ -203,7 +216,7 @@ def sanitize_input(text: str, max_length: int = None) -> str:
         return ''
     
     # Remove null bytes and control characters
-    sanitized = ''.join(c for c in text if ord(c) >= 32 or c in '\t\n\r')
+    sanitized = text.translate(CONTROL_CHARS_TABLE)
     
     # Limit length
     if max_length:
@@ -214,6 +227,30 @@ def sanitize_input(text: str, max_length: int = None) -> str:
     
     return sanitized
 
+def _upload_size(file) -> int:
+    """
+    Size of an uploaded file, without seeking through it when avoidable
+    
+    request.content_length covers the whole multipart body, so the part's
+    own Content-Length or the spooled temp file's size is used instead;
+    seek/tell is the fallback for in-memory parts.
+    """
+    if file.content_length:
+        return file.content_length
+    
+    stream = file.stream
+    # Asking an in-memory SpooledTemporaryFile for its fileno would force a
+    # rollover to disk, so only streams already backed by a file are stat'ed
+    if getattr(stream, '_rolled', True):
+        try:
+            return os.fstat(stream.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            pass
+    position = stream.tell()
+    size = stream.seek(0, 2)
+    stream.seek(position)
+    return size
+
 def validate_video_upload(file) -> tuple[bool, str]:
     """
     Validate uploaded video file for security
@@ -232,9 +269,7 @@ def validate_video_upload(file) -> tuple[bool, str]:
         return False, "Invalid filename"
     
     # Check file size (already handled by Flask's MAX_CONTENT_LENGTH, but double-check)
-    file.seek(0, 2)  # Seek to end
-    size = file.tell()
-    file.seek(0)  # Reset position
+    size = _upload_size(file)
     
     max_size = current_app.config.get('MAX_CONTENT_LENGTH', 500 * 1024 * 1024)  # 500MB
     if size > max_size:
@@ -244,13 +279,33 @@ def validate_video_upload(file) -> tuple[bool, str]:
         return False, "File too small"
     
     # Check file extension
-    allowed_extensions = {'mp4', 'avi', 'mov', 'mkv', 'wmv', 'flv', 'webm'}
-    ext = file.filename.lower().split('.')[-1] if '.' in file.filename else ''
-    if ext not in allowed_extensions:
-        return False, f"File type not supported (allowed: {', '.join(allowed_extensions)})"
+    if _extension(file.filename) not in VIDEO_EXTENSIONS:
+        return False, UNSUPPORTED_TYPE_ERROR
     
     return True, ""
 
+# (epoch second the cached day ends, 'YYYY-MM-DD') for hash_client_id
+_client_id_day = (0.0, '')
+
+def _current_day() -> str:
+    """Today's local date string, formatted once per day instead of per request"""
+    global _client_id_day
+    day_end, date_str = _client_id_day
+    if time.time() >= day_end:
+        now = datetime.now()
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        date_str = now.strftime('%Y-%m-%d')
+        _client_id_day = (tomorrow.timestamp(), date_str)
+    return date_str
+
+@lru_cache(maxsize=8)
+def _salt_key(salt: str) -> bytes:
+    """BLAKE2b key for a salt, compressed when longer than the 64-byte key limit"""
+    key = salt.encode()
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        key = hashlib.blake2b(key).digest()
+    return key
+
 def hash_client_id(client_ip: str, user_agent: str = None) -> str:
     """
     Create a hashed client identifier for privacy
@@ -263,15 +318,16 @@ def hash_client_id(client_ip: str, user_agent: str = None) -> str:
         Hashed client identifier
     """
     # Include date to rotate hashes daily
-    date_str = datetime.now().strftime('%Y-%m-%d')
+    date_str = _current_day()
     
     # Combine IP, user agent, and date
     identifier = f"{client_ip}:{user_agent or ''}:{date_str}"
     
-    # Hash with a secret salt (should be configured per deployment)
-    salt = os.getenv('RATE_LIMIT_SALT', 'default-salt-change-in-production')
+    # Keyed with a secret salt (should be configured per deployment); rate
+    # limiting needs no collision resistance, so a 64-bit BLAKE2b MAC is plenty
+    key = _salt_key(config.RATE_LIMIT_SALT)
     
-    return hashlib.sha256(f"{salt}:{identifier}".encode()).hexdigest()[:16]
+    return hashlib.blake2b(identifier.encode(), digest_size=8, key=key).hexdigest()
 
 class SecurityConfig:
     """Security configuration constants"""
@@ -294,7 +350,7 @@ class SecurityConfig:
     
     # Content security
     MAX_UPLOAD_SIZE = 500 * 1024 * 1024  # 500MB
-    ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'wmv', 'flv', 'webm'}
+    ALLOWED_VIDEO_EXTENSIONS = VIDEO_EXTENSIONS
     
     # Logging
     LOG_SECURITY_EVENTS = True
@@ -1,4 +1,35 @@
 // Open Video Watermark - Frontend JavaScript
+
+// Chunked upload settings
+const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;  // files larger than this are chunked
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_PARALLEL_CHUNKS = 10;
+
+// Limits how many promises run at once
+class Semaphore {
+    constructor(max) {
+        this.available = max;
+        this.waiting = [];
+    }
+
+    acquire() {
+        if (this.available > 0) {
+            this.available--;
+            return Promise.resolve();
+        }
+        return new Promise(resolve => this.waiting.push(resolve));
+    }
+
+    release() {
+        const next = this.waiting.shift();
+        if (next) {
+            next();
+        } else {
+            this.available++;
+        }
+    }
+}
+
 class VideoWatermarkApp {
     constructor() {
         this.socket = null;
@@ -269,8 +300,13 @@ class VideoWatermarkApp {
             return;
         }
         
+        // Large files go through the parallel chunked uploader
+        const files = Array.from(fileInput.files);
+        const largeFiles = files.filter(file => file.size > CHUNKED_UPLOAD_THRESHOLD);
+        const smallFiles = files.filter(file => file.size <= CHUNKED_UPLOAD_THRESHOLD);
+        
         // Add files to form data
-        Array.from(fileInput.files).forEach(file => {
+        smallFiles.forEach(file => {
             formData.append('files', file);
         });
         formData.append('watermark_text', watermarkText);
@@ -283,31 +319,54 @@ class VideoWatermarkApp {
         });
         
         try {
-            const response = await fetch('/upload', {
-                method: 'POST',
-                body: formData
-            });
+            const uploaded = [];
+            const errors = [];
             
-            const result = await response.json();
+            if (smallFiles.length > 0) {
+                const response = await fetch('/upload', {
+                    method: 'POST',
+                    body: formData
+                });
+                
+                const result = await response.json();
+                uploaded.push(...(result.files || []));
+                errors.push(...(result.errors || []));
+                if (!response.ok && !result.errors) {
+                    errors.push(result.error || 'Unknown error occurred.');
+                }
+            }
             
-            if (response.ok) {
-                this.showToast('success', 'Upload Successful', result.message);
+            for (const file of largeFiles) {
+                try {
+                    const result = await this.uploadInChunks(file, watermarkText, strength);
+                    uploaded.push(...result.files);
+                } catch (error) {
+                    errors.push(`${file.name}: ${error.message}`);
+                }
+            }
+            
+            if (uploaded.length > 0) {
+                let message = `Successfully uploaded ${uploaded.length} file(s)`;
+                if (errors.length > 0) {
+                    message += ` (${errors.length} failed)`;
+                }
+                this.showToast('success', 'Upload Successful', message);
                 
                 // Clear form
                 fileInput.value = '';
                 document.getElementById('file-list').innerHTML = '';
                 
                 // Show processing status
-                this.showProcessingStatus(result.files);
+                this.showProcessingStatus(uploaded);
                 
                 // Join socket rooms for each task
-                result.files.forEach(file => {
+                uploaded.forEach(file => {
                     console.log('Joining room for task:', file.task_id);
                     this.socket.emit('join_task', { task_id: file.task_id });
                 });
                 
             } else {
-                this.showToast('error', 'Upload Failed', result.error || 'Unknown error occurred.');
+                this.showToast('error', 'Upload Failed', errors.join('\n') || 'Unknown error occurred.');
             }
         } catch (error) {
             console.error('Upload error:', error);
@@ -315,6 +374,49 @@ class VideoWatermarkApp {
         }
     }
 
+    // Upload one file as fixed-size chunks, several in flight at once
+    async uploadInChunks(file, watermarkText, strength) {
+        const uploadId = crypto.randomUUID().replace(/-/g, '');
+        const totalChunks = Math.ceil(file.size / UPLOAD_CHUNK_SIZE);
+        const slots = new Semaphore(MAX_PARALLEL_CHUNKS);
+        let finalResult = null;
+        
+        const sendChunk = async (index) => {
+            await slots.acquire();
+            try {
+                const formData = new FormData();
+                const start = index * UPLOAD_CHUNK_SIZE;
+                formData.append('chunk', file.slice(start, start + UPLOAD_CHUNK_SIZE), file.name);
+                formData.append('upload_id', uploadId);
+                formData.append('chunk_index', index);
+                formData.append('total_chunks', totalChunks);
+                formData.append('filename', file.name);
+                formData.append('watermark_text', watermarkText);
+                formData.append('strength', strength);
+                
+                const response = await fetch('/upload/chunk', {
+                    method: 'POST',
+                    body: formData
+                });
+                const result = await response.json();
+                if (!response.ok) {
+                    throw new Error(result.error || 'Chunk upload failed');
+                }
+                if (result.files) {
+                    finalResult = result;
+                }
+            } finally {
+                slots.release();
+            }
+        };
+        
+        await Promise.all(Array.from({ length: totalChunks }, (_, index) => sendChunk(index)));
+        if (!finalResult) {
+            throw new Error('Upload did not complete');
+        }
+        return finalResult;
+    }
+
     showProcessingStatus(files) {
         console.log('Showing processing status for files:', files);
         const processingContainer = document.getElementById('processing-status');
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Task status tracking for Open Video Watermark
+Keeps the latest status of each processing task with per-state counters,
+bounded in size and with finished tasks expiring after a TTL.
+"""
+
+import time
+import threading
+from itertools import islice
+from collections import OrderedDict
+
+class StatusStore:
+    """Thread-safe, bounded map of task_id -> status dict"""
+
+    STATES = ('queued', 'processing', 'completed', 'error')
+    TERMINAL_STATES = ('completed', 'error')
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Least recently updated first
+        self._entries = OrderedDict()
+        # Finished tasks in completion order: task_id -> monotonic finish time
+        self._finished = OrderedDict()
+        self._counts = dict.fromkeys(self.STATES, 0)
+
+    def set(self, task_id: str, status: str, progress: int, message: str):
+        """
+        Record a task state change
+
+        A task that reached a terminal state is never moved back, so late
+        progress reports cannot overwrite its final status.
+
+        Returns:
+            The new status dict, or None if the update was ignored
+        """
+        with self._lock:
+            previous = self._entries.get(task_id)
+            if previous:
+                if previous['status'] in self.TERMINAL_STATES:
+                    return None
+                self._counts[previous['status']] -= 1
+
+            entry = {
+                'task_id': task_id,
+                'status': status,
+                'progress': progress,
+                'message': message
+            }
+            self._entries[task_id] = entry
+            self._entries.move_to_end(task_id)
+            self._counts[status] += 1
+            if status in self.TERMINAL_STATES:
+                self._finished[task_id] = time.monotonic()
+
+            # Over capacity: drop the oldest finished tasks, never active ones
+            while len(self._entries) > self.max_entries and self._finished:
+                self._pop(next(iter(self._finished)))
+            return entry
+
+    def get(self, task_id: str, default=None):
+        """Return the status dict for task_id"""
+        return self._entries.get(task_id, default)
+
+    def remove(self, task_id: str):
+        """Forget a task's status"""
+        with self._lock:
+            self._pop(task_id)
+
+    def evict_expired(self) -> int:
+        """Drop statuses of tasks that finished more than ttl seconds ago"""
+        cutoff = time.monotonic() - self.ttl
+        evicted = 0
+        with self._lock:
+            while self._finished:
+                task_id, finished_at = next(iter(self._finished.items()))
+                if finished_at > cutoff:
+                    break
+                self._pop(task_id)
+                evicted += 1
+        return evicted
+
+    def _pop(self, task_id):
+        """Remove an entry and keep counters in step (lock must be held)"""
+        entry = self._entries.pop(task_id, None)
+        if entry:
+            self._counts[entry['status']] -= 1
+        self._finished.pop(task_id, None)
+
+    def counts(self) -> dict:
+        """Number of tasks in each state"""
+        with self._lock:
+            return dict(self._counts)
+
+    def count(self, status: str) -> int:
+        """Number of tasks in one state"""
+        return self._counts[status]
+
+    def recent(self, limit: int) -> list:
+        """The most recently updated statuses, newest first"""
+        if limit <= 0:
+            return []
+        # Walk from the newest end so the cost is O(limit), not O(n)
+        with self._lock:
+            return list(islice(reversed(self._entries.values()), limit))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, task_id):
+        return task_id in self._entries
@@ -9,24 +9,26 @@ import numpy as np
 import cv2
 from watermark.dct_watermark import DCTWatermark
 from watermark.video_processor import VideoProcessor
+from create_demo import open_video_writer
 
 def create_test_video(output_path, duration=5, fps=30, width=640, height=480):
     """Create a simple test video for testing purposes"""
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    out, _ = open_video_writer(output_path, fps, width, height)
     
     total_frames = duration * fps
     
+    # Background color of every frame (BGR), a gradient over the clip
+    colors = np.array([
+        (128, int(255 * ((total_frames - i) / total_frames)), int(255 * (i / total_frames)))
+        for i in range(total_frames)
+    ], dtype=np.uint8)
+    
+    # One frame buffer, repainted in place each iteration
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    
     for i in range(total_frames):
         # Create a simple test frame with changing colors
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Create a gradient effect
-        color_r = int(255 * (i / total_frames))
-        color_g = int(255 * ((total_frames - i) / total_frames))
-        color_b = 128
-        
-        frame[:, :] = [color_b, color_g, color_r]  # BGR format
+        frame[:] = colors[i]
         
         # Add some text to make it more interesting
         cv2.putText(frame, f'Frame {i+1}/{total_frames}', (50, 50), 
@@ -103,7 +105,7 @@ def test_video_processing():
         def progress_callback(frame_num, total_frames, message="Processing"):
             print(f"\r{message}: {frame_num}/{total_frames} ({int(100*frame_num/total_frames)}%)", end="")
         
-        success = processor.embed_watermark_in_video(
+        success, _ = processor.embed_watermark_in_video(
             test_video_path, watermarked_video_path, watermark_text, 
             strength, watermarker, progress_callback
         )
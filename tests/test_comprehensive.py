@@ -14,15 +14,32 @@ from unittest.mock import patch, MagicMock
 import sys
 import threading
 import time
+import logging
+import logging.handlers
 from io import BytesIO
+from datetime import datetime
+from werkzeug.datastructures import FileStorage
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from watermark.dct_watermark import DCTWatermark
 from watermark.video_processor import VideoProcessor
-from app import app, processing_queue, processing_status, file_registry
+from app import (
+    app, processing_status, file_registry, allowed_file, parse_watermark_options,
+    drain_progress_reports, publish_status, event_subscribers, borrow_watermarker, submit_task,
+    handle_task_done, chunk_part_path, chunk_uploads, expire_chunk_uploads, video_processor
+)
+# After app, which monkey-patches the stdlib under gevent
+from concurrent.futures.process import BrokenProcessPool
+from registry import FileRegistry
+from security import (
+    RateLimiter, validate_filename, validate_video_upload, hash_client_id, sanitize_input
+)
+from status_store import StatusStore
+from logging_setup import QuietPollingFilter
 import config
+import worker
 
 class TestDCTWatermark:
     """Test the DCT watermarking algorithm"""
@@ -40,19 +57,59 @@ class TestDCTWatermark:
     def test_grayscale_image(self):
         return np.random.randint(0, 256, (256, 256), dtype=np.uint8)
     
-    def test_text_to_binary_conversion(self, watermarker):
-        """Test text to binary conversion"""
+    def test_text_to_bits_conversion(self, watermarker):
+        """Test text to bit array conversion"""
         text = "Test"
-        binary = watermarker._text_to_binary(text)
-        assert len(binary) == len(text) * 8
-        assert binary == "01010100011001010111001101110100"
+        bits = watermarker._text_to_bits(text)
+        assert bits.dtype == np.uint8
+        assert len(bits) == len(text) * 8
+        assert ''.join(map(str, bits)) == "01010100011001010111001101110100"
+        # Non-Latin-1 characters still take one byte each
+        assert len(watermarker._text_to_bits("T\u20ac")) == 16
     
-    def test_binary_to_text_conversion(self, watermarker):
-        """Test binary to text conversion"""
-        binary = "01010100011001010111001101110100"
-        text = watermarker._binary_to_text(binary)
-        assert text == "Test"
+    def test_bits_to_text_conversion(self, watermarker):
+        """Test bit array to text conversion"""
+        bits = np.array([int(b) for b in "01010100011001010111001101110100"], dtype=np.uint8)
+        assert watermarker._bits_to_text(bits) == "Test"
+        # A trailing partial byte is dropped
+        assert watermarker._bits_to_text(np.append(bits, [1, 0, 1])) == "Test"
     
+    def test_reuse_across_videos(self, watermarker, test_image):
+        """Test that one instance can be reset and reused for another watermark"""
+        first = watermarker.embed_watermark(test_image, "First", 0.1)
+        watermarker.reset()
+        assert not watermarker._binary_cache
+        second = watermarker.embed_watermark(test_image, "Other", 0.1)
+        assert np.array_equal(first, DCTWatermark().embed_watermark(test_image, "First", 0.1))
+        assert np.array_equal(second, DCTWatermark().embed_watermark(test_image, "Other", 0.1))
+
+    def test_work_buffers_reused(self, watermarker, test_image):
+        """Test that scratch buffers survive across frames and outputs do not alias them"""
+        first = watermarker.embed_watermark(test_image, "Buffer", 0.1)
+        work = watermarker._buffers['work']
+        second = watermarker.embed_watermark(test_image, "Buffer", 0.1)
+        assert watermarker._buffers['work'] is work
+        assert np.array_equal(first, second)
+        assert not np.shares_memory(second, work)
+
+        # A new frame size gets a new buffer, holding only the block rows that
+        # carry bits (48 bits over 13 blocks per row); the rows below are untouched
+        small = test_image[:100, :100, 0]
+        watermarked = watermarker.embed_watermark(small, "Buffer", 0.1)
+        assert watermarker._buffers['work'].shape == (32, 104)
+        assert np.array_equal(watermarked[32:], small[32:])
+
+    def test_embed_watermark_in_place(self, watermarker, test_image):
+        """Test that out= writes the same result into a caller-owned frame"""
+        expected = watermarker.embed_watermark(test_image, "InPlace", 0.1)
+        frame = test_image.copy()
+        assert watermarker.embed_watermark(frame, "InPlace", 0.1, out=frame) is frame
+        assert np.array_equal(frame, expected)
+
+        target = np.zeros_like(test_image)
+        watermarker.embed_watermark(test_image, "InPlace", 0.1, out=target)
+        assert np.array_equal(target, expected)
+
     def test_embed_watermark_color(self, watermarker, test_image):
         """Test watermark embedding in color image"""
         watermark_text = "TestWatermark"
@@ -61,7 +118,10 @@ class TestDCTWatermark:
         assert watermarked.shape == test_image.shape
         assert watermarked.dtype == np.uint8
         assert not np.array_equal(watermarked, test_image)
-    
+        # Only the block rows carrying bits (104 over 32 blocks per row) go through YCrCb
+        assert np.array_equal(watermarked[32:], test_image[32:])
+        assert watermarker._buffers['ycc'].shape == (32, 256, 3)
+
     def test_embed_watermark_grayscale(self, watermarker, test_grayscale_image):
         """Test watermark embedding in grayscale image"""
         watermark_text = "Test"
@@ -71,6 +131,67 @@ class TestDCTWatermark:
         assert watermarked.dtype == np.uint8
         assert not np.array_equal(watermarked, test_grayscale_image)
     
+    def test_batched_blocks_match_single_block_path(self, watermarker):
+        """Test that the batched block transform matches embedding block by block"""
+        image = np.random.randint(0, 256, (50, 44), dtype=np.uint8)
+        watermark_text = "Batch"
+        watermarked = watermarker.embed_watermark(image, watermark_text, 0.1)
+        
+        # Reference: one block at a time over the edge-padded image, in raster order
+        bits = watermarker._text_to_bits(watermark_text)
+        expected = np.pad(image, ((0, 6), (0, 4)), mode='edge').astype(np.float32)
+        blocks_w = expected.shape[1] // 8
+        for index, bit in enumerate(bits):
+            y, x = (index // blocks_w) * 8, (index % blocks_w) * 8
+            expected[y:y + 8, x:x + 8] = watermarker._embed_bit_in_block(expected[y:y + 8, x:x + 8], str(bit), 0.1)
+        expected = np.clip(expected[:50, :44], 0, 255).astype(np.uint8)
+        assert np.array_equal(watermarked, expected)
+        
+        marked = np.pad(watermarked, ((0, 6), (0, 4)), mode='edge').astype(np.float32)
+        expected_bits = [
+            int(watermarker._extract_bit_from_block(marked[y:y + 8, x:x + 8]))
+            for y, x in (((i // blocks_w) * 8, (i % blocks_w) * 8) for i in range(len(bits)))
+        ]
+        assert watermarker.extract_watermark(watermarked, len(watermark_text)) == \
+            watermarker._bits_to_text(expected_bits)
+    
+    def test_batched_robust_embedding_matches_single_block_path(self, watermarker):
+        """Test that batched redundant embedding matches the per-block robust helpers"""
+        channel = np.random.randint(0, 256, (80, 40), dtype=np.uint8)
+        watermarked = watermarker._embed_in_channel(channel, "Re", 0.2, 3)
+        
+        bits = np.repeat(watermarker._text_to_bits("Re"), 3)
+        expected = channel.astype(np.float32)
+        extracted = []
+        for index, bit in enumerate(bits):
+            y, x = (index // 5) * 8, (index % 5) * 8
+            position = index % len(watermarker.embedding_positions)
+            expected[y:y + 8, x:x + 8] = watermarker._embed_bit_robust(expected[y:y + 8, x:x + 8], str(bit), 0.2, position)
+            extracted.append(int(watermarker._extract_bit_robust(
+                watermarked[y:y + 8, x:x + 8].astype(np.float32), position
+            )))
+        expected = np.clip(expected, 0, 255).astype(np.uint8)
+        
+        # Float rounding may move a pixel across an integer boundary
+        assert np.abs(watermarked.astype(int) - expected).max() <= 1
+        assert watermarker._extract_from_channel(watermarked, 2, 3, voting=False) == \
+            watermarker._bits_to_text(extracted[:16])
+
+    def test_majority_voting(self, watermarker):
+        """Test that voting recovers each bit from its repeated copies"""
+        clean = np.repeat(watermarker._text_to_bits("Vo"), 3)
+        # One corrupted copy per group is outvoted
+        bits = clean.copy()
+        bits[::3] ^= 1
+        channel = np.zeros((16, 400), dtype=np.uint8)
+        with patch('watermark.dct_watermark.extract_blocks_quantized', lambda *args: bits.copy()):
+            assert watermarker._extract_from_channel(channel, 2, 3, voting=True) == "Vo"
+
+        # A short read leaves a partial last group, which votes on its own
+        short = clean[:-1]
+        with patch('watermark.dct_watermark.extract_blocks_quantized', lambda *args: short.copy()):
+            assert watermarker._extract_from_channel(channel, 2, 3, voting=True) == "Vo"
+
     def test_extract_watermark(self, watermarker, test_image):
         """Test watermark extraction"""
         watermark_text = "Extract"
@@ -80,7 +201,27 @@ class TestDCTWatermark:
         # Note: Perfect extraction is not always guaranteed due to quantization
         assert isinstance(extracted, str)
         assert len(extracted) == len(watermark_text)
-    
+
+    def test_embed_watermark_batch(self, watermarker):
+        """Test that the threaded batch API matches embedding frame by frame"""
+        frames = [np.random.randint(0, 256, (72, 96, 3), dtype=np.uint8) for _ in range(5)]
+        batch = watermarker.embed_watermark_batch(frames, "Batch", 0.1, max_workers=3)
+        
+        assert len(batch) == len(frames)
+        for frame, watermarked in zip(frames, batch):
+            assert np.array_equal(watermarked, DCTWatermark().embed_watermark(frame, "Batch", 0.1))
+        assert watermarker.embed_watermark_batch([], "Batch", 0.1) == []
+
+    def test_color_watermark_in_luma(self, watermarker):
+        """Test that color frames are marked in Y, keeping colors and surviving JPEG"""
+        yy, xx = np.mgrid[0:128, 0:160]
+        image = cv2.GaussianBlur(np.dstack([xx * 1.5, yy * 2, (xx + yy) * 0.8]).astype(np.uint8), (5, 5), 0)
+        watermarked = watermarker.embed_watermark(image, "Luma", 0.05)
+
+        assert np.abs(watermarked.astype(int) - image).mean() < 2
+        _, encoded = cv2.imencode('.jpg', watermarked, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        assert watermarker.extract_watermark(cv2.imdecode(encoded, cv2.IMREAD_COLOR), 4) == "Luma"
+
     def test_enhanced_watermark_embedding(self, watermarker, test_image):
         """Test enhanced watermark embedding with redundancy"""
         watermark_text = "Enhanced"
@@ -208,7 +349,23 @@ class TestVideoProcessor:
         duration = processor.get_video_duration(test_video_path)
         assert duration > 0
         assert duration <= 2  # Should be around 1 second
-    
+
+    def test_metadata_probed_once(self, processor, test_video_path):
+        """Test that metadata checks on one file share a single open until it changes"""
+        with patch('watermark.video_processor.cv2.VideoCapture', wraps=cv2.VideoCapture) as opened:
+            assert processor.validate_video_file(test_video_path) is True
+            assert processor.validate_video_comprehensive(test_video_path)['valid'] is True
+            processor.estimate_processing_time(test_video_path, "Probe")
+            processor.get_video_info(test_video_path)['width'] = 0
+            assert processor.get_video_info(test_video_path)['width'] == 320
+            assert opened.call_count == 1
+
+            # A new modification time invalidates the cached probe
+            stat = os.stat(test_video_path)
+            os.utime(test_video_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            assert processor.get_video_duration(test_video_path) > 0
+            assert opened.call_count == 2
+
     def test_create_processing_stats(self, processor):
         """Test processing statistics creation"""
         stats = processor.create_processing_stats()
@@ -246,7 +403,14 @@ class TestFlaskApp:
         data = json.loads(response.data)
         assert 'app' in data
         assert data['app']['version'] == config.VERSION
-    
+
+    def test_system_info_does_not_block(self, client):
+        """Test that repeated system info polls are served from the cache"""
+        start = time.monotonic()
+        for _ in range(3):
+            assert client.get('/system/info').status_code == 200
+        assert time.monotonic() - start < 1.0
+
     def test_queue_status(self, client):
         """Test queue status endpoint"""
         response = client.get('/queue/status')
@@ -256,7 +420,88 @@ class TestFlaskApp:
         assert 'active_tasks' in data
         assert 'completed_tasks' in data
         assert 'failed_tasks' in data
-    
+
+    def test_status_counters_reported(self, client):
+        """Test that queue status reports the status store counters"""
+        processing_status.set('counter-test', 'completed', 100, 'Done')
+        try:
+            data = json.loads(client.get('/queue/status').data)
+            assert data['completed_tasks'] == processing_status.count('completed')
+        finally:
+            processing_status.remove('counter-test')
+
+    def test_status_poll_revalidation(self, client):
+        """Test that unchanged task status is answered with 304"""
+        processing_status.set('etag-test', 'processing', 40, 'Processing')
+        try:
+            response = client.get('/status/etag-test')
+            assert response.status_code == 200
+            assert response.headers['Cache-Control'] == 'no-store, max-age=0'
+            etag = response.headers['ETag']
+
+            response = client.get('/status/etag-test', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+
+            processing_status.set('etag-test', 'processing', 41, 'Processing')
+            response = client.get('/status/etag-test', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert json.loads(response.data)['progress'] == 41
+        finally:
+            processing_status.remove('etag-test')
+
+    def test_task_events_stream(self, client):
+        """Test that /events streams status changes until the task finishes"""
+        assert client.get('/events/no-such-task').status_code == 404
+
+        processing_status.set('sse-test', 'processing', 10, 'Working')
+        try:
+            response = client.get('/events/sse-test', buffered=False)
+            assert response.mimetype == 'text/event-stream'
+            events = iter(response.response)
+            assert json.loads(next(events)[len(b'data: '):])['progress'] == 10
+
+            publish_status(processing_status.set('sse-test', 'processing', 20, 'Working'))
+            publish_status(processing_status.set('sse-test', 'completed', 100, 'Done'))
+
+            # Only the latest unread status is delivered, then the stream ends
+            assert json.loads(next(events)[len(b'data: '):])['status'] == 'completed'
+            assert next(events, None) is None
+            assert 'sse-test' not in event_subscribers
+        finally:
+            processing_status.remove('sse-test')
+
+    def test_watermarker_pool(self):
+        """Test that requests reuse pooled DCTWatermarks, one borrower at a time"""
+        with borrow_watermarker() as first:
+            with borrow_watermarker() as second:
+                assert second is not first
+        with borrow_watermarker() as again:
+            assert again is first
+
+    def test_allowed_file(self):
+        """Test upload extension check"""
+        assert allowed_file('clip.mp4')
+        assert allowed_file('CLIP.MOV')
+        assert allowed_file('archive.tar.webm')
+        assert not allowed_file('clip.txt')
+        assert not allowed_file('mp4')
+        assert not allowed_file('')
+
+    def test_json_provider(self):
+        """Test that responses are serialized by the orjson provider"""
+        with app.app_context():
+            payload = {'name': 'vidéo ✓', 'when': datetime(2024, 1, 2, 3, 4, 5), 1: 'x'}
+            data = json.loads(app.json.dumps(payload))
+        assert data['name'] == 'vidéo ✓'
+        assert data['when'].startswith('2024-01-02T03:04:05')
+        assert data['1'] == 'x'
+
+        with app.test_request_context():
+            response = app.json.response([{'id': 'a'}])
+        assert response.mimetype == 'application/json'
+        assert response.get_data() == b'[{"id":"a"}]\n'
+
     def test_list_files_empty(self, client):
         """Test file listing when empty"""
         response = client.get('/files')
@@ -305,6 +550,15 @@ class TestFlaskApp:
         assert 'error' in data
         assert 'empty' in data['error'].lower()
     
+    def test_parse_frame_stride(self):
+        """Test frame stride validation in upload options"""
+        options, error = parse_watermark_options({'watermark_text': 'Test', 'frame_stride': '5'})
+        assert error is None
+        assert options['frame_stride'] == 5
+        assert parse_watermark_options({'watermark_text': 'Test'})[0]['frame_stride'] == 1
+        assert parse_watermark_options({'watermark_text': 'Test', 'frame_stride': '0'})[1]
+        assert parse_watermark_options({'watermark_text': 'Test', 'frame_stride': 'x'})[1]
+
     def test_upload_invalid_strength(self, client):
         """Test upload with invalid strength value"""
         response = client.post('/upload', data={
@@ -342,6 +596,233 @@ class TestFlaskApp:
         assert 'error' in data
 
 
+class TestStatusStore:
+    """Test the bounded task status store"""
+
+    def test_counters_follow_transitions(self):
+        """Test that state counters follow transitions"""
+        store = StatusStore()
+        store.set('a', 'queued', 0, 'Queued')
+        store.set('a', 'processing', 50, 'Working')
+        store.set('a', 'completed', 100, 'Done')
+
+        # A late progress report must not reopen a finished task
+        assert store.set('a', 'processing', 60, 'Late') is None
+        assert store.counts() == {'queued': 0, 'processing': 0, 'completed': 1, 'error': 0}
+        assert store.get('a')['status'] == 'completed'
+
+        store.remove('a')
+        assert 'a' not in store
+        assert store.count('completed') == 0
+
+    def test_ttl_eviction(self):
+        """Test that finished statuses expire and active ones stay"""
+        store = StatusStore(ttl=-1)
+        store.set('done', 'error', 0, 'Failed')
+        store.set('running', 'processing', 10, 'Working')
+        assert store.evict_expired() == 1
+        assert 'done' not in store
+        assert 'running' in store
+
+    def test_recent_newest_first(self):
+        """Test that recent() returns the latest updates first"""
+        store = StatusStore()
+        for task_id in ('a', 'b', 'c'):
+            store.set(task_id, 'queued', 0, 'Queued')
+        store.set('a', 'processing', 5, 'Working')
+
+        assert [entry['task_id'] for entry in store.recent(2)] == ['a', 'c']
+        assert len(store.recent(10)) == 3
+        assert store.recent(0) == []
+
+    def test_capacity_drops_oldest_finished(self):
+        """Test that the size bound evicts finished tasks, never active ones"""
+        store = StatusStore(max_entries=2)
+        store.set('old', 'completed', 100, 'Done')
+        store.set('active', 'processing', 10, 'Working')
+        store.set('new', 'queued', 0, 'Queued')
+        assert 'old' not in store
+        assert 'active' in store and 'new' in store
+        assert len(store) == 2
+        assert [s['task_id'] for s in store.recent(10)] == ['new', 'active']
+
+
+class TestSecurity:
+    """Test rate limiting and input validation helpers"""
+
+    def test_window_slides(self):
+        """Test that requests are allowed again once old ones leave the window"""
+        limiter = RateLimiter()
+        with patch('security.time.monotonic', return_value=1000.0):
+            assert all(limiter.is_allowed('client', 3, 10) for _ in range(3))
+            assert not limiter.is_allowed('client', 3, 10)
+            # Other clients and other limits are counted separately
+            assert limiter.is_allowed('other', 3, 10)
+            assert limiter.is_allowed('client', 5, 10)
+
+        with patch('security.time.monotonic', return_value=1010.5):
+            assert limiter.is_allowed('client', 3, 10)
+
+    def test_cleanup_drops_idle_clients(self):
+        """Test that clients idle for an hour are forgotten"""
+        limiter = RateLimiter()
+        with patch('security.time.monotonic', return_value=1000.0):
+            limiter.is_allowed('idle', 3, 10)
+        with patch('security.time.monotonic', return_value=5000.0):
+            limiter.is_allowed('active', 3, 10)
+            limiter._cleanup()
+        assert [key[0] for clients, _ in limiter.shards for key in clients] == ['active']
+
+    def test_concurrent_requests_counted_once(self):
+        """Test that parallel requests from one client never exceed the limit"""
+        limiter = RateLimiter()
+        results = []
+
+        def hit():
+            for _ in range(50):
+                results.append(limiter.is_allowed('burst', 100, 60))
+
+        threads = [threading.Thread(target=hit) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results.count(True) == 100
+
+    def test_client_id_hash(self):
+        """Test that client ids are stable, salted and do not expose the address"""
+        first = hash_client_id('203.0.113.7', 'agent')
+        assert first == hash_client_id('203.0.113.7', 'agent')
+        assert len(first) == 16 and '203.0.113.7' not in first
+        assert first != hash_client_id('203.0.113.8', 'agent')
+        with patch.object(config, 'RATE_LIMIT_SALT', 's' * 100):
+            assert hash_client_id('203.0.113.7', 'agent') != first
+
+    def test_client_id_rotates_daily(self):
+        """Test that the cached date still rotates client ids at midnight"""
+        before, after = datetime(2024, 1, 1, 23, 59, 59), datetime(2024, 1, 2, 0, 0, 1)
+        with patch('security._client_id_day', (0.0, '')), \
+                patch('security.datetime', wraps=datetime) as fake_datetime:
+            fake_datetime.now.return_value = before
+            with patch('security.time.time', return_value=before.timestamp()):
+                first = hash_client_id('203.0.113.7', 'agent')
+            # Within the same day the cached date is reused without formatting
+            fake_datetime.now.return_value = after
+            with patch('security.time.time', return_value=before.timestamp() + 0.5):
+                assert hash_client_id('203.0.113.7', 'agent') == first
+            with patch('security.time.time', return_value=after.timestamp()):
+                assert hash_client_id('203.0.113.7', 'agent') != first
+
+    def test_validate_video_upload_size(self, tmp_path):
+        """Test upload size checks for in-memory and spooled uploads"""
+        spooled = open(tmp_path / 'part', 'w+b')
+        spooled.write(b'\0' * 4096)
+        spooled.seek(100)
+        with app.app_context():
+            assert validate_video_upload(FileStorage(BytesIO(b'\0' * 4096), 'clip.mp4')) == (True, '')
+            assert not validate_video_upload(FileStorage(BytesIO(b'\0' * 100), 'clip.mp4'))[0]
+            assert validate_video_upload(FileStorage(spooled, 'clip.mp4')) == (True, '')
+        # The read position is left where it was
+        assert spooled.tell() == 100
+        spooled.close()
+
+        # A small upload still in memory is measured without rolling it to disk
+        in_memory = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        in_memory.write(b'\0' * 4096)
+        in_memory.seek(0)
+        with app.app_context():
+            assert validate_video_upload(FileStorage(in_memory, 'clip.mp4')) == (True, '')
+        assert in_memory._rolled is False
+        assert in_memory.tell() == 0
+        in_memory.close()
+
+    def test_sanitize_input(self):
+        """Test that control characters are removed but tabs and newlines kept"""
+        assert sanitize_input('  a\x00b\x07c\td\ne\x1f  ') == 'abc\td\ne'
+        assert sanitize_input('\x00' * 10 + 'watermark', max_length=5) == 'water'
+        assert sanitize_input(None) == ''
+
+    def test_validate_filename(self):
+        """Test that unsafe filenames are rejected"""
+        assert validate_filename('holiday clip.mp4')
+        assert validate_filename('tab\tname.mp4')
+        for name in ('', '../etc/passwd', 'a/b.mp4', 'a\\b.mp4', 'nul\x00.mp4',
+                     'bell\x07.mp4', 'run.SH', 'x' * 256):
+            assert not validate_filename(name), name
+
+
+class TestFileRegistry:
+    """Test the SQLite-backed file registry"""
+    
+    @pytest.fixture
+    def registry(self, tmp_path):
+        return FileRegistry(str(tmp_path / 'registry.db'))
+    
+    @staticmethod
+    def _entry(file_id, date):
+        return {
+            'id': file_id,
+            'original_filename': f'{file_id}.mp4',
+            'processed_filename': f'{file_id}_watermarked.mp4',
+            'watermark_text': 'Test',
+            'strength': 0.1,
+            'processed_date': date,
+            'file_size': 1024
+        }
+    
+    def test_add_get_delete(self, registry):
+        """Test basic registry operations"""
+        registry.add(self._entry('a', '2024-01-01T00:00:00'))
+        assert 'a' in registry
+        assert len(registry) == 1
+        assert registry.get('a')['processed_filename'] == 'a_watermarked.mp4'
+        assert registry.total_size() == 1024
+        
+        assert registry.delete('a') is True
+        assert 'a' not in registry
+        assert registry.get('a') is None
+        assert registry.delete('a') is False
+        assert len(registry) == 0
+        assert registry.total_size() == 0
+    
+    def test_aggregates_follow_writes(self, registry):
+        """Test cached count and size are refreshed by every write"""
+        registry.add(self._entry('a', '2024-01-01T00:00:00'))
+        assert (len(registry), registry.total_size()) == (1, 1024)
+        
+        registry.add({**self._entry('a', '2024-01-01T00:00:00'), 'file_size': 4096})
+        registry.add_many([self._entry('b', '2024-01-02T00:00:00')])
+        assert (len(registry), registry.total_size()) == (2, 5120)
+    
+    def test_list_recent_newest_first(self, registry):
+        """Test listing is sorted by processed date and honours the limit"""
+        registry.add(self._entry('old', '2024-01-01T00:00:00'))
+        registry.add(self._entry('new', '2024-03-01T00:00:00'))
+        registry.add(self._entry('mid', '2024-02-01T00:00:00'))
+        
+        assert [f['id'] for f in registry.list_recent()] == ['new', 'mid', 'old']
+        assert [f['id'] for f in registry.list_recent(1)] == ['new']
+    
+    def test_add_many_single_transaction(self, registry):
+        """Test bulk inserts land together or not at all"""
+        registry.add_many([self._entry('a', '2024-01-01T00:00:00'), self._entry('b', '2024-01-02T00:00:00')])
+        assert len(registry) == 2
+
+        with pytest.raises(Exception):
+            registry.add_many([self._entry('c', '2024-01-03T00:00:00'), {'file_size': object()}])
+        assert 'c' not in registry
+        assert len(registry) == 2
+
+    def test_migrates_legacy_json(self, tmp_path):
+        """Test entries from registry.json are imported once"""
+        with open(tmp_path / 'registry.json', 'w') as f:
+            json.dump({'a': self._entry('a', '2024-01-01T00:00:00')}, f)
+        
+        registry = FileRegistry(str(tmp_path / 'registry.db'))
+        assert 'a' in registry
+        assert not (tmp_path / 'registry.json').exists()
+
+
 class TestConfiguration:
     """Test configuration and setup"""
     
@@ -355,6 +836,16 @@ class TestConfiguration:
         assert config.MIN_STRENGTH < config.MAX_STRENGTH
         assert config.MAX_WATERMARK_LENGTH > 0
     
+    def test_logging_goes_through_queue(self):
+        """Test that the web process logs via a queue and skips polling access logs"""
+        root = logging.getLogger()
+        assert any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers)
+
+        quiet = QuietPollingFilter()
+        make = lambda msg: logging.LogRecord('werkzeug', logging.INFO, __file__, 0, msg, None, None)
+        assert not quiet.filter(make('"GET /status/abc HTTP/1.1" 200 -'))
+        assert quiet.filter(make('"POST /upload HTTP/1.1" 200 -'))
+
     def test_secret_key_generation(self):
         """Test secret key generation"""
         secret = config.get_secret_key()
@@ -393,6 +884,107 @@ class TestIntegration:
             if os.path.exists(f.name):
                 os.unlink(f.name)
     
+    def test_frame_stride_skips_watermarking(self, temp_video):
+        """Test that only every Nth frame is watermarked but all frames are written"""
+        watermarker = DCTWatermark()
+        processor = VideoProcessor()
+        output_path = temp_video.replace('.mp4', '_stride.mp4')
+
+        try:
+            with patch.object(watermarker, 'embed_watermark', wraps=watermarker.embed_watermark) as embed:
+                success, _ = processor.embed_watermark_in_video(
+                    temp_video, output_path, "Stride", 0.1, watermarker, frame_stride=3
+                )
+            assert success is True
+            assert embed.call_count == 4  # frames 1, 4, 7, 10
+            assert processor.get_video_info(output_path)['frame_count'] == 10
+        finally:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+
+    def test_pipeline_stops_on_error(self, temp_video):
+        """Test that a failure mid-video shuts the decode/encode threads down"""
+        watermarker = DCTWatermark()
+        processor = VideoProcessor()
+        output_path = temp_video.replace('.mp4', '_abort.mp4')
+
+        def progress_callback(frame_num, total_frames, message):
+            if frame_num == 3:
+                raise RuntimeError("stop")
+
+        threads_before = threading.active_count()
+        try:
+            assert processor.embed_watermark_in_video(
+                temp_video, output_path, "Abort", 0.1, watermarker, progress_callback
+            ) == (False, 0)
+            assert threading.active_count() == threads_before
+        finally:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+
+    def test_pipeline_surfaces_decode_error(self, temp_video):
+        """Test that a read error in the decoder thread fails the video instead of ending it early"""
+        watermarker = DCTWatermark()
+        processor = VideoProcessor()
+        output_path = temp_video.replace('.mp4', '_decode.mp4')
+        open_capture = cv2.VideoCapture
+
+        def failing_capture(path):
+            cap = MagicMock(wraps=open_capture(path))
+            reads = []
+
+            def read(*args):
+                reads.append(None)
+                if len(reads) == 4:
+                    raise cv2.error("decode failed")
+                return cap._mock_wraps.read(*args)
+
+            cap.read.side_effect = read
+            return cap
+
+        try:
+            with patch('watermark.video_processor.cv2.VideoCapture', failing_capture), \
+                    patch('watermark.video_processor.logger') as logger:
+                assert processor.embed_watermark_in_video(
+                    temp_video, output_path, "Decode", 0.1, watermarker
+                ) == (False, 0)
+            assert "decode failed" in str(logger.error.call_args)
+        finally:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+
+    def test_sampling_seek_matches_sequential(self, temp_video):
+        """Test that seeking to sampled frames returns the same frames as reading through"""
+        processor = VideoProcessor()
+
+        def sample(stride):
+            cap = cv2.VideoCapture(temp_video)
+            try:
+                return list(processor._sample_frames(cap, stride))
+            finally:
+                cap.release()
+
+        with patch('watermark.video_processor.SEEK_MIN_STRIDE', 100):
+            sequential = sample(3)
+        with patch('watermark.video_processor.SEEK_MIN_STRIDE', 2):
+            seeked = sample(3)
+
+        assert [index for index, _ in seeked] == [0, 3, 6, 9]
+        assert [index for index, _ in sequential] == [0, 3, 6, 9]
+        for (_, a), (_, b) in zip(seeked, sequential):
+            assert np.array_equal(a, b)
+
+    def test_extraction_stops_on_agreement(self, temp_video):
+        """Test that video extraction stops once enough sampled frames agree"""
+        processor = VideoProcessor()
+        watermarker = MagicMock()
+        watermarker.extract_watermark.side_effect = ["Noise", "Mark", "Mark", "Mark", "Mark"]
+
+        assert processor.extract_watermark_from_video(
+            temp_video, 4, watermarker, frame_sample_rate=1
+        ) == "Mark"
+        assert watermarker.extract_watermark.call_count == 4
+
     def test_complete_watermarking_workflow(self, temp_video):
         """Test complete watermarking workflow"""
         watermarker = DCTWatermark()
@@ -418,14 +1010,14 @@ class TestIntegration:
                 progress_calls.append((frame_num, total_frames, message))
             
             # Process video
-            success = processor.embed_watermark_in_video(
+            success, output_size = processor.embed_watermark_in_video(
                 temp_video, output_path, watermark_text, 0.15,
                 watermarker, progress_callback
             )
             
             assert success is True
             assert os.path.exists(output_path)
-            assert os.path.getsize(output_path) > 0
+            assert output_size == os.path.getsize(output_path) > 0
             
             # Check that progress callback was called
             assert len(progress_calls) > 0
@@ -446,7 +1038,297 @@ class TestIntegration:
             # Cleanup
             if os.path.exists(output_path):
                 os.unlink(output_path)
-    
+
+    def test_upload_processed_by_worker_pool(self, temp_video):
+        """Test that an uploaded video is watermarked by the process pool"""
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            with open(temp_video, 'rb') as f:
+                response = client.post('/upload', data={
+                    'watermark_text': 'PoolTest',
+                    'strength': '0.1',
+                    'files': (f, 'pool_test.mp4')
+                }, content_type='multipart/form-data')
+            assert response.status_code == 200
+            task_id = json.loads(response.data)['files'][0]['task_id']
+
+            # Wait for the worker process to finish
+            status = {}
+            for _ in range(200):
+                status = json.loads(client.get(f'/status/{task_id}').data)
+                if status['status'] in ('completed', 'error'):
+                    break
+                time.sleep(0.1)
+
+            assert status['status'] == 'completed'
+            assert task_id in file_registry
+
+            # Cleanup
+            response = client.delete(f'/delete/{task_id}')
+            assert response.status_code == 200
+
+    def test_pool_worker_import_skips_web_state(self, tmp_path):
+        """Test that a worker re-importing app.py as __mp_main__ starts no pool, registry or libmagic"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = tmp_path / 'worker_import.py'
+        script.write_text(
+            "import os, runpy, sys, multiprocessing\n"
+            f"os.environ['UPLOAD_FOLDER'] = {str(tmp_path / 'uploads')!r}\n"
+            f"os.environ['PROCESSED_FOLDER'] = {str(tmp_path / 'processed')!r}\n"
+            f"sys.path.insert(0, {root!r})\n"
+            f"ns = runpy.run_path({os.path.join(root, 'app.py')!r}, run_name='__mp_main__')\n"
+            "assert ns['executor'] is None and ns['progress_queue'] is None\n"
+            "assert ns['file_registry'] is None and ns['mime_detector'] is None\n"
+            "assert not multiprocessing.active_children()\n"
+        )
+        # os.system rather than subprocess, which gevent patches in this process
+        log = tmp_path / 'worker_import.log'
+        status = os.system(f'cd "{tmp_path}" && "{sys.executable}" "{script}" > "{log}" 2>&1')
+        assert os.waitstatus_to_exitcode(status) == 0, log.read_text()
+        assert not (tmp_path / 'processed' / 'registry.db').exists()
+
+    def test_pool_progress_published(self, temp_video):
+        """Test that progress reported by a pool worker reaches clients before completion"""
+        published = []
+
+        def record(status):
+            published.append(status)
+            publish_status(status)
+
+        def finish_after_progress(task, future):
+            # Give the dispatcher time to relay the worker's reports first
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not any(
+                    s['status'] == 'processing' for s in published):
+                time.sleep(0.05)
+            handle_task_done(task, future)
+
+        app.config['TESTING'] = True
+        with patch('app.publish_status', record), \
+                patch('app.handle_task_done', finish_after_progress), \
+                app.test_client() as client:
+            with open(temp_video, 'rb') as f:
+                response = client.post('/upload', data={
+                    'watermark_text': 'Progress',
+                    'files': (f, 'progress_test.mp4')
+                }, content_type='multipart/form-data')
+            assert response.status_code == 200
+            task_id = json.loads(response.data)['files'][0]['task_id']
+
+            for _ in range(300):
+                if any(s['status'] == 'completed' for s in published):
+                    break
+                time.sleep(0.1)
+
+            statuses = [s['status'] for s in published if s['task_id'] == task_id]
+            assert 'processing' in statuses
+            assert statuses[-1] == 'completed'
+
+            # Cleanup
+            response = client.delete(f'/delete/{task_id}')
+            assert response.status_code == 200
+
+    def test_multi_file_upload_saved_in_parallel(self, temp_video):
+        """Test that every file of one request is saved and reported in order"""
+        app.config['TESTING'] = True
+        with open(temp_video, 'rb') as f:
+            video = f.read()
+
+        with app.test_client() as client, patch('app.enqueue_video', return_value=None):
+            response = client.post('/upload', data={
+                'watermark_text': 'Batch',
+                'files': [
+                    (BytesIO(video), 'first.mp4'),
+                    (BytesIO(b'text'), 'notes.txt'),
+                    (BytesIO(video), 'second.mp4')
+                ]
+            }, content_type='multipart/form-data')
+
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert [item['filename'] for item in data['files']] == ['first.mp4', 'second.mp4']
+        assert data['errors'] == ['notes.txt: File type not supported']
+        for item in data['files']:
+            saved = os.path.join(app.config['UPLOAD_FOLDER'], f"{item['task_id']}_{item['filename']}")
+            assert os.path.getsize(saved) == len(video)
+            # Probed on the save pool, so queueing validates from the cache
+            assert any(key[0] == saved for key in video_processor._probes)
+            os.remove(saved)
+
+    def test_fake_video_rejected_before_saving(self):
+        """Test that a non-video payload is rejected without touching disk"""
+        app.config['TESTING'] = True
+        before = set(os.listdir(app.config['UPLOAD_FOLDER']))
+        with app.test_client() as client:
+            response = client.post('/upload', data={
+                'watermark_text': 'Fake',
+                'files': (BytesIO(b'not a video at all' * 100), 'fake.mp4')
+            }, content_type='multipart/form-data')
+
+        assert response.status_code == 400
+        assert 'magic number' in json.loads(response.data)['errors'][0]
+        assert set(os.listdir(app.config['UPLOAD_FOLDER'])) == before
+
+    def test_estimate_time_sniffs_before_saving(self, temp_video):
+        """Test that one-off analysis endpoints reject non-video early"""
+        app.config['TESTING'] = True
+        before = set(os.listdir(app.config['UPLOAD_FOLDER']))
+        with app.test_client() as client:
+            response = client.post('/estimate-time', data={
+                'file': (BytesIO(b'plain text' * 100), 'fake.mp4')
+            }, content_type='multipart/form-data')
+            assert response.status_code == 400
+            assert set(os.listdir(app.config['UPLOAD_FOLDER'])) == before
+
+            with open(temp_video, 'rb') as f:
+                response = client.post('/estimate-time', data={
+                    'file': (f, 'clip.mp4')
+                }, content_type='multipart/form-data')
+            assert response.status_code == 200
+            assert 'estimate' in json.loads(response.data)
+        assert set(os.listdir(app.config['UPLOAD_FOLDER'])) == before
+
+    def test_download_range_and_x_accel(self):
+        """Test resumable downloads and nginx offloading"""
+        app.config['TESTING'] = True
+        processed_filename = 'download-test_watermarked_clip.mp4'
+        file_path = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
+        with open(file_path, 'wb') as f:
+            f.write(b'0123456789')
+        file_registry.add({
+            'id': 'download-test', 'original_filename': 'clip.mp4',
+            'processed_filename': processed_filename, 'processed_date': datetime.now().isoformat(),
+            'file_size': 10
+        })
+
+        try:
+            with app.test_client() as client:
+                response = client.get('/download/download-test', headers={'Range': 'bytes=4-'})
+                assert response.status_code == 206
+                assert response.data == b'456789'
+                assert response.headers['ETag']
+
+                with patch.object(config, 'X_ACCEL_REDIRECT', True):
+                    response = client.get('/download/download-test')
+                assert response.status_code == 200
+                assert response.data == b''
+                assert response.headers['X-Accel-Redirect'] == config.X_ACCEL_PREFIX + processed_filename
+                assert 'watermarked_clip.mp4' in response.headers['Content-Disposition']
+        finally:
+            file_registry.delete('download-test')
+            os.remove(file_path)
+
+    def test_chunked_upload_out_of_order(self, temp_video):
+        """Test that chunks arriving out of order are merged and queued"""
+        app.config['TESTING'] = True
+        with open(temp_video, 'rb') as f:
+            data = f.read()
+        chunk_size = len(data) // 3 + 1
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+        with app.test_client() as client:
+            responses = []
+            for index in reversed(range(len(chunks))):
+                responses.append(client.post('/upload/chunk', data={
+                    'upload_id': 'chunktest0001',
+                    'chunk_index': str(index),
+                    'total_chunks': str(len(chunks)),
+                    'filename': 'chunked.mp4',
+                    'watermark_text': 'ChunkTest',
+                    'strength': '0.1',
+                    'chunk': (BytesIO(chunks[index]), 'chunked.mp4')
+                }, content_type='multipart/form-data'))
+
+            assert all(r.status_code == 200 for r in responses)
+            assert json.loads(responses[0].data)['received'] == 1
+            task_id = json.loads(responses[-1].data)['files'][0]['task_id']
+            assert task_id in processing_status
+
+            status = {}
+            for _ in range(200):
+                status = json.loads(client.get(f'/status/{task_id}').data)
+                if status['status'] in ('completed', 'error'):
+                    break
+                time.sleep(0.1)
+            assert status['status'] == 'completed'
+            client.delete(f'/delete/{task_id}')
+
+    def test_chunked_upload_size_limit(self):
+        """Test that a chunked upload is dropped once its parts exceed the size limit"""
+        app.config['TESTING'] = True
+        before = set(os.listdir(app.config['UPLOAD_FOLDER']))
+
+        def send(client, index, upload_id='chunklimit001', total=5, size=800):
+            return client.post('/upload/chunk', data={
+                'upload_id': upload_id,
+                'chunk_index': str(index),
+                'total_chunks': str(total),
+                'filename': 'big.mp4',
+                'watermark_text': 'Limit',
+                'chunk': (BytesIO(b'x' * size), 'big.mp4')
+            }, content_type='multipart/form-data')
+
+        with app.test_client() as client, patch.dict(app.config, {'MAX_CONTENT_LENGTH': 2000}):
+            assert send(client, 0).status_code == 200
+            assert send(client, 1).status_code == 200
+            response = send(client, 2)
+            assert response.status_code == 413
+            assert 'too large' in json.loads(response.data)['error']
+            # Parts still in flight for the rejected upload are discarded as well
+            assert send(client, 3).status_code == 413
+
+            # Re-sent parts are ignored instead of replacing the counted ones
+            assert send(client, 0, 'chunklimit002', 3, 10).status_code == 200
+            assert send(client, 1, 'chunklimit002', 3, 10).status_code == 200
+            for index in (0, 1):
+                response = send(client, index, 'chunklimit002', 3, 1000)
+                assert response.status_code == 200
+                assert json.loads(response.data)['received'] == 2
+            assert os.path.getsize(chunk_part_path('chunklimit002', 0)) == 10
+            # The assembled parts are no video, so they are dropped before merging
+            assert send(client, 2, 'chunklimit002', 3, 10).status_code == 400
+
+            response = client.post('/estimate-time', data={
+                'file': (BytesIO(b'x' * 4000), 'big.mp4')
+            }, content_type='multipart/form-data')
+            assert response.status_code == 413
+            assert 'error' in json.loads(response.data)
+
+        assert set(os.listdir(app.config['UPLOAD_FOLDER'])) == before
+
+    def test_abandoned_chunk_uploads_expire(self):
+        """Test that idle chunked uploads are dropped with their parts and new ones are capped"""
+        app.config['TESTING'] = True
+        before = set(os.listdir(app.config['UPLOAD_FOLDER']))
+
+        def send(client, upload_id):
+            return client.post('/upload/chunk', data={
+                'upload_id': upload_id,
+                'chunk_index': '0',
+                'total_chunks': '2',
+                'filename': 'idle.mp4',
+                'watermark_text': 'Idle',
+                'chunk': (BytesIO(b'x' * 10), 'idle.mp4')
+            }, content_type='multipart/form-data')
+
+        with app.test_client() as client, \
+                patch.object(config, 'MAX_ACTIVE_CHUNK_UPLOADS', len(chunk_uploads) + 1):
+            assert send(client, 'chunkidle001').status_code == 200
+            assert send(client, 'chunkidle002').status_code == 503
+            assert os.path.exists(chunk_part_path('chunkidle001', 0))
+
+            # With a negative TTL every upload counts as idle
+            with patch.object(config, 'CHUNK_UPLOAD_TTL', -1):
+                assert expire_chunk_uploads() >= 1
+            assert 'chunkidle001' not in chunk_uploads
+            assert not os.path.exists(chunk_part_path('chunkidle001', 0))
+
+            assert send(client, 'chunkidle002').status_code == 200
+            with patch.object(config, 'CHUNK_UPLOAD_TTL', -1):
+                expire_chunk_uploads()
+
+        assert set(os.listdir(app.config['UPLOAD_FOLDER'])) == before
+
     def test_error_handling_invalid_video(self):
         """Test error handling with invalid video file"""
         processor = VideoProcessor()
@@ -508,6 +1390,63 @@ class TestPerformance:
         
         # This test mainly ensures no memory leaks or resource issues
 
+    def test_progress_reports_throttled(self):
+        """Test that per-frame progress is coalesced before reaching the web process"""
+        reports = []
+
+        class FakeQueue:
+            def put(self, item):
+                reports.append(item)
+
+        def fake_embed(self, input_path, output_path, text, strength, watermarker, progress_callback, **kwargs):
+            for frame_num in range(1, 10001):
+                progress_callback(frame_num, 10000, "Processing")
+            return True, 1
+
+        worker.init_worker(FakeQueue())
+        with patch.object(VideoProcessor, 'embed_watermark_in_video', fake_embed):
+            worker.process_video_task({
+                'id': 'throttle-test', 'input_path': 'in.mp4', 'output_path': 'out.mp4',
+                'watermark_text': 'Test', 'strength': 0.1, 'original_filename': 'in.mp4'
+            })
+
+        # Initial report, at most one per percent, and always the final frame
+        assert len(reports) <= 102
+        assert reports[-1][1:3] == (10000, 10000)
+
+    def test_submit_task_replaces_broken_pool(self):
+        """Test that a broken pool is replaced and a failed submit frees its slot"""
+        broken = MagicMock()
+        broken.submit.side_effect = BrokenProcessPool('worker died')
+        fresh = MagicMock()
+        fresh.submit.side_effect = RuntimeError('cannot schedule new futures')
+        slots = threading.BoundedSemaphore(1)
+
+        with patch('app.executor', broken), patch('app.create_executor', return_value=fresh), \
+                patch('app.task_slots', slots):
+            with pytest.raises(RuntimeError):
+                submit_task({'id': 'broken-pool'})
+
+            broken.shutdown.assert_called_once()
+            fresh.submit.assert_called_once()
+            assert slots.acquire(blocking=False)
+
+    def test_progress_drained_in_batches(self):
+        """Test that queued progress reports are coalesced per task"""
+        import queue
+        reports = queue.Queue()
+        for frame_num in range(1, 6):
+            reports.put(('task-a', frame_num, 5, 'Processing'))
+        reports.put(('task-b', 1, 3, 'Processing'))
+
+        with patch('app.progress_queue', reports):
+            batch = drain_progress_reports(4)
+            assert batch == {'task-a': (4, 5, 'Processing')}
+
+            batch = drain_progress_reports(64)
+            assert batch == {'task-a': (5, 5, 'Processing'), 'task-b': (1, 3, 'Processing')}
+            assert drain_progress_reports(64) == {}
+
 
 if __name__ == '__main__':
     # Run the tests
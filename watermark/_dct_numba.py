@@ -0,0 +1,160 @@
+"""
+Numba kernels for the DCT watermark
+If numba cannot be imported the kernels are None and DCTWatermark uses its
+NumPy block-stack paths instead.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def _row_coeffs(plane, y0, row, col_tiled, coeffs):
+        """
+        DCT coefficient (1, 2) of every block in the block row starting at y0
+
+        The products run along whole pixel rows (col_tiled is dct[2] repeated
+        for each block) and are summed per block afterwards, so the inner loop
+        is contiguous and vectorizes across neighbouring blocks.
+        """
+        n = row.shape[0]
+        width = col_tiled.shape[0]
+        weighted = np.zeros(width, dtype=np.float32)
+        for j in range(n):
+            r = row[j]
+            for x in range(width):
+                weighted[x] += r * plane[y0 + j, x] * col_tiled[x]
+        for b in range(coeffs.shape[0]):
+            coeff = np.float32(0.0)
+            for k in range(n):
+                coeff += weighted[b * n + k]
+            coeffs[b] = coeff
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def embed_blocks(plane, bits, dct, strength):
+        """
+        Embed one bit per block, in place, into the first len(bits) blocks of
+        a padded float32 plane (raster order), through DCT coefficient (1, 2)
+
+        Only that coefficient changes, so instead of a full forward and
+        inverse transform each block gets the coefficient c = dct[1] @ block
+        @ dct[2] and adds (new - c) * outer(dct[1], dct[2]), its basis image.
+        Block rows run in parallel.
+        """
+        n = dct.shape[0]
+        blocks_w = plane.shape[1] // n
+        count = min(bits.shape[0], (plane.shape[0] // n) * blocks_w)
+        delta = np.float32(strength * 255)
+        row = dct[1]
+        col_tiled = np.empty(blocks_w * n, dtype=np.float32)
+        for x in range(blocks_w * n):
+            col_tiled[x] = dct[2, x % n]
+
+        for by in prange((count + blocks_w - 1) // blocks_w):
+            y0 = by * n
+            first = by * blocks_w
+            coeffs = np.empty(blocks_w, dtype=np.float32)
+            _row_coeffs(plane, y0, row, col_tiled, coeffs)
+
+            # Per-pixel step: zero past the last marked block of the final row
+            steps = np.zeros(blocks_w * n, dtype=np.float32)
+            for b in range(min(blocks_w, count - first)):
+                sign = np.float32(2 * np.int32(bits[first + b]) - 1)
+                step = abs(coeffs[b]) + sign * delta - coeffs[b]
+                for k in range(n):
+                    steps[b * n + k] = step * col_tiled[b * n + k]
+            for j in range(n):
+                r = row[j]
+                for x in range(blocks_w * n):
+                    plane[y0 + j, x] += r * steps[x]
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def extract_blocks(plane, count, dct):
+        """
+        Read one bit per block from the first `count` blocks of a padded
+        float32 plane (raster order): 1 where DCT coefficient (1, 2) is positive
+        """
+        n = dct.shape[0]
+        blocks_w = plane.shape[1] // n
+        count = min(count, (plane.shape[0] // n) * blocks_w)
+        row = dct[1]
+        col_tiled = np.empty(blocks_w * n, dtype=np.float32)
+        for x in range(blocks_w * n):
+            col_tiled[x] = dct[2, x % n]
+        bits = np.zeros(count, dtype=np.uint8)
+
+        for by in prange((count + blocks_w - 1) // blocks_w):
+            first = by * blocks_w
+            coeffs = np.empty(blocks_w, dtype=np.float32)
+            _row_coeffs(plane, by * n, row, col_tiled, coeffs)
+            for b in range(min(blocks_w, count - first)):
+                bits[first + b] = coeffs[b] > 0
+        return bits
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def embed_blocks_quantized(plane, bits, basis, used, step):
+        """
+        Redundant-path embedding, in place: block b of the padded float32
+        plane (raster order) carries bits[b] in the coefficient whose basis
+        image is basis[b % len(basis)], quantized to an odd (1) or even (0)
+        multiple of `step`; blocks whose position index is `used` or more are
+        left unchanged
+        """
+        n = basis.shape[1]
+        blocks_w = plane.shape[1] // n
+        count = min(bits.shape[0], (plane.shape[0] // n) * blocks_w)
+        cycle = basis.shape[0]
+
+        for b in prange(count):
+            p = b % cycle
+            if p >= used:
+                continue
+            y0 = (b // blocks_w) * n
+            x0 = (b % blocks_w) * n
+
+            coeff = np.float32(0.0)
+            for j in range(n):
+                for k in range(n):
+                    coeff += plane[y0 + j, x0 + k] * basis[p, j, k]
+
+            target = step * (2 * np.rint(coeff / (2 * step)) + bits[b])
+            change = np.float32(target - coeff)
+            for j in range(n):
+                for k in range(n):
+                    plane[y0 + j, x0 + k] += change * basis[p, j, k]
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def extract_blocks_quantized(plane, count, basis, used, step):
+        """
+        Redundant-path extraction: 1 where block b's coefficient (basis image
+        basis[b % len(basis)]) is an odd multiple of `step`; blocks whose
+        position index is `used` or more read as 0
+        """
+        n = basis.shape[1]
+        blocks_w = plane.shape[1] // n
+        count = min(count, (plane.shape[0] // n) * blocks_w)
+        cycle = basis.shape[0]
+        bits = np.zeros(count, dtype=np.uint8)
+
+        for b in prange(count):
+            p = b % cycle
+            if p >= used:
+                continue
+            y0 = (b // blocks_w) * n
+            x0 = (b % blocks_w) * n
+
+            coeff = np.float32(0.0)
+            for j in range(n):
+                for k in range(n):
+                    coeff += plane[y0 + j, x0 + k] * basis[p, j, k]
+            bits[b] = np.rint(coeff / step) % 2 == 1
+        return bits
+else:
+    embed_blocks = None
+    extract_blocks = None
+    embed_blocks_quantized = None
+    extract_blocks_quantized = None
@@ -2,12 +2,26 @@ import cv2
 import numpy as np
 import os
 import logging
+import queue
+import threading
 import time
+from collections import Counter, OrderedDict
 from typing import Callable, Optional, Dict, Any, Tuple
-from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Frames buffered between the decode, watermark and encode stages
+PIPELINE_DEPTH = 8
+
+# Sampling strides at or above this seek instead of decoding every frame
+SEEK_MIN_STRIDE = 30
+
+# Video extraction stops once this many sampled frames agree on the text
+EXTRACT_AGREEMENT = 3
+
+# Probed files whose metadata is cached; the least recently used go first
+PROBE_CACHE_SIZE = 64
+
 class VideoProcessor:
     """
     Video processing class for embedding watermarks in video files.
@@ -18,32 +32,86 @@ class VideoProcessor:
         self.supported_codecs = ['mp4v', 'XVID', 'MJPG', 'X264']
         self.max_resolution = (3840, 2160)  # 4K max
         self.min_resolution = (320, 240)    # Minimum viable resolution
+        # Metadata per (path, mtime, size), so the checks a request runs on
+        # one upload share a single open of the file
+        self._probes = OrderedDict()
+        self._probe_lock = threading.Lock()
+    
+    def _probe(self, video_path):
+        """
+        Open a video once and read its metadata and first frame
+        
+        Results are cached by path, modification time and size, so a file
+        that changes is probed again.
+        
+        Args:
+            video_path: Path to video file
+            
+        Returns:
+            Dict with 'info' (as get_video_info) and 'readable' (the first
+            frame decodes), or None if OpenCV cannot open the file
+        """
+        stat = os.stat(video_path)
+        key = (os.fspath(video_path), stat.st_mtime_ns, stat.st_size)
+        with self._probe_lock:
+            if key in self._probes:
+                self._probes.move_to_end(key)
+                return self._probes[key]
+        
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                probe = None
+            else:
+                info = {
+                    'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                    'fps': cap.get(cv2.CAP_PROP_FPS),
+                    'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    'codec': int(cap.get(cv2.CAP_PROP_FOURCC))
+                }
+                # grab() decodes the first frame without converting it to BGR
+                probe = {'info': info, 'readable': cap.grab()}
+        finally:
+            cap.release()
+        
+        with self._probe_lock:
+            self._probes[key] = probe
+            while len(self._probes) > PROBE_CACHE_SIZE:
+                self._probes.popitem(last=False)
+        return probe
     
     def get_video_info(self, video_path):
         """Get basic information about a video file"""
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
+            probe = self._probe(video_path)
+            if probe is None:
                 logger.error(f"Could not open video file: {video_path}")
                 return None
             
-            info = {
-                'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
-                'fps': cap.get(cv2.CAP_PROP_FPS),
-                'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-                'codec': int(cap.get(cv2.CAP_PROP_FOURCC))
-            }
-            
-            cap.release()
-            logger.debug(f"Video info for {video_path}: {info}")
+            # A copy, so callers cannot change the cached metadata
+            info = dict(probe['info'])
+            logger.debug("Video info for %s: %s", video_path, info)
             return info
         except Exception as e:
             logger.error(f"Error getting video info for {video_path}: {e}")
             return None
     
+    def _apply_capture_opts(self, cap, capture_opts):
+        """Apply optional settings to an opened VideoCapture"""
+        if not capture_opts:
+            return
+        
+        # A one-frame decode buffer keeps only the current frame in memory. Live
+        # streams would drop frames while we watermark, but files just wait.
+        buffer_size = capture_opts.get('buffer_size')
+        if buffer_size:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+    
     def embed_watermark_in_video(self, input_path, output_path, watermark_text, 
-                                strength, watermarker, progress_callback: Optional[Callable] = None):
+                                strength, watermarker, progress_callback: Optional[Callable] = None,
+                                capture_opts: Optional[Dict[str, Any]] = None,
+                                frame_stride: int = 1):
         """
         Embed watermark in a video file
         
@@ -54,15 +122,18 @@ class VideoProcessor:
             strength: Watermark embedding strength
             watermarker: DCTWatermark instance
             progress_callback: Function to call with progress updates
+            capture_opts: Capture settings, e.g. {'buffer_size': 1}
+            frame_stride: Watermark every Nth frame; other frames are copied unchanged
             
         Returns:
-            True if successful, False otherwise
+            Tuple of (success, output file size in bytes)
         """
         try:
             # Open input video
             cap = cv2.VideoCapture(input_path)
             if not cap.isOpened():
-                return False
+                return False, 0
+            self._apply_capture_opts(cap, capture_opts)
             
             # Get video properties
             fps = cap.get(cv2.CAP_PROP_FPS)
@@ -72,7 +143,7 @@ class VideoProcessor:
             
             if total_frames == 0:
                 cap.release()
-                return False
+                return False, 0
             
             # Define codec and create VideoWriter
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
@@ -80,45 +151,153 @@ class VideoProcessor:
             
             if not out.isOpened():
                 cap.release()
-                return False
-            
-            frame_count = 0
-            
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                frame_count += 1
-                
-                # Embed watermark in frame
+                return False, 0
+            
+            # Decode and encode run on their own threads, so reading and
+            # writing overlap with watermarking in this one; bounded queues
+            # keep at most PIPELINE_DEPTH frames waiting at each hand-off.
+            # Written frames go back to the decoder to be read into again, so
+            # only the frames in flight are ever allocated.
+            decoded = queue.Queue(maxsize=PIPELINE_DEPTH)
+            encoded = queue.Queue(maxsize=PIPELINE_DEPTH)
+            spare = queue.Queue()
+            stop = threading.Event()
+            read_errors = []
+            write_errors = []
+            
+            def decode_frames():
+                # A failed read still ends the stream with the sentinel; the
+                # error is kept so the consumer does not mistake it for EOF
                 try:
-                    watermarked_frame = watermarker.embed_watermark(frame, watermark_text, strength)
-                    out.write(watermarked_frame)
+                    while not stop.is_set():
+                        try:
+                            ret, frame = cap.read(spare.get_nowait())
+                        except queue.Empty:
+                            ret, frame = cap.read()
+                        if not ret:
+                            break
+                        decoded.put(frame)
                 except Exception as e:
-                    logger.warning(f"Error processing frame {frame_count}: {e}")
-                    # Write original frame if watermarking fails
-                    out.write(frame)
+                    read_errors.append(e)
+                finally:
+                    decoded.put(None)
+            
+            def encode_frames():
+                # Keeps draining after a failed write so the pipeline cannot stall
+                while True:
+                    frame = encoded.get()
+                    if frame is None:
+                        break
+                    if not write_errors:
+                        try:
+                            out.write(frame)
+                            spare.put(frame)
+                        except Exception as e:
+                            write_errors.append(e)
+            
+            decoder = threading.Thread(target=decode_frames, name='video-decode', daemon=True)
+            encoder = threading.Thread(target=encode_frames, name='video-encode', daemon=True)
+            decoder.start()
+            encoder.start()
+            
+            frame_count = 0
+            try:
+                while True:
+                    frame = decoded.get()
+                    if frame is None:
+                        if read_errors:
+                            raise read_errors[0]
+                        break
+                    
+                    frame_count += 1
+                    
+                    # Every frame has to be decoded to be re-encoded, so the
+                    # stride only skips the watermarking work
+                    if (frame_count - 1) % frame_stride == 0:
+                        # Embed watermark in frame; the decoded frame is ours,
+                        # so it is marked in place instead of copied
+                        try:
+                            frame = watermarker.embed_watermark(frame, watermark_text, strength,
+                                                                out=frame)
+                        except Exception as e:
+                            # Write original frame if watermarking fails
+                            logger.warning(f"Error processing frame {frame_count}: {e}")
+                    encoded.put(frame)
+                    
+                    # Update progress
+                    if progress_callback:
+                        progress_callback(frame_count, total_frames, "Processing")
+            finally:
+                # Stop the decoder (draining unblocks a pending put), then let
+                # the encoder write out what it already has
+                stop.set()
+                while decoder.is_alive():
+                    try:
+                        decoded.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                encoded.put(None)
+                encoder.join()
                 
-                # Update progress
-                if progress_callback:
-                    progress_callback(frame_count, total_frames, "Processing")
+                # Release resources
+                cap.release()
+                out.release()
             
-            # Release resources
-            cap.release()
-            out.release()
+            if write_errors:
+                raise write_errors[0]
             
             # Verify output file was created and has content
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            try:
+                output_size = os.stat(output_path).st_size
+            except FileNotFoundError:
+                output_size = 0
+            
+            if output_size > 0:
                 logger.info(f"Video processing completed successfully: {output_path}")
-                return True
+                return True, output_size
             else:
                 logger.error(f"Output video file is empty or missing: {output_path}")
-                return False
+                return False, 0
                 
         except Exception as e:
             logger.error(f"Error processing video {input_path}: {e}", exc_info=True)
-            return False
+            return False, 0
+    
+    def _sample_frames(self, cap, frame_sample_rate):
+        """
+        Yield (index, frame) for every frame_sample_rate-th frame of cap
+        
+        Wide strides seek straight to each sampled frame, so only the frames
+        between it and the preceding keyframe are decoded. Seeking is frame
+        accurate but pays that keyframe run-up on every sample, which costs
+        more than reading through when samples are closer together than a
+        typical GOP (and CAP_PROP_POS_MSEC keyframe seeks would land on the
+        wrong frames), so narrow strides and streams without a frame count
+        are read through with grab().
+        """
+        frame_sample_rate = max(1, int(frame_sample_rate))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        
+        if frame_sample_rate >= SEEK_MIN_STRIDE and total_frames > 0:
+            for index in range(0, total_frames, frame_sample_rate):
+                if index and not cap.set(cv2.CAP_PROP_POS_FRAMES, index):
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield index, frame
+            return
+        
+        # grab() still decodes (later frames depend on it) but skips the
+        # conversion to BGR; retrieve() converts only the sampled frames
+        index = 0
+        while cap.grab():
+            if index % frame_sample_rate == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield index, frame
+            index += 1
     
     def extract_watermark_from_video(self, video_path, watermark_length, watermarker, 
                                    frame_sample_rate=30):
@@ -139,42 +318,32 @@ class VideoProcessor:
             if not cap.isOpened():
                 return None
             
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            frame_count = 0
-            extracted_texts = []
+            counter = Counter()
             
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Sample frames at specified rate
-                if frame_count % frame_sample_rate == 0:
-                    try:
-                        extracted_text = watermarker.extract_watermark(frame, watermark_length)
-                        if extracted_text and "Error" not in extracted_text:
-                            extracted_texts.append(extracted_text)
-                    except Exception as e:
-                        print(f"Error extracting from frame {frame_count}: {e}")
-                
-                frame_count += 1
+            for frame_count, frame in self._sample_frames(cap, frame_sample_rate):
+                try:
+                    extracted_text = watermarker.extract_watermark(frame, watermark_length)
+                    if extracted_text and "Error" not in extracted_text:
+                        counter[extracted_text] += 1
+                except Exception as e:
+                    logger.warning(f"Error extracting from frame {frame_count}: {e}")
                 
-                # Don't need to process all frames for extraction
-                if len(extracted_texts) >= 10:
+                # Don't need to process all frames for extraction: stop once
+                # one text has been read often enough, or after 10 reads
+                if counter and (counter.most_common(1)[0][1] >= EXTRACT_AGREEMENT
+                                or sum(counter.values()) >= 10):
                     break
             
             cap.release()
             
-            if extracted_texts:
+            if counter:
                 # Return the most common extracted text
-                from collections import Counter
-                counter = Counter(extracted_texts)
                 return counter.most_common(1)[0][0]
             else:
                 return None
                 
         except Exception as e:
-            print(f"Error extracting watermark from video: {e}")
+            logger.error(f"Error extracting watermark from video: {e}")
             return None
     
     def validate_video_file(self, file_path):
@@ -188,15 +357,9 @@ class VideoProcessor:
             True if valid video, False otherwise
         """
         try:
-            cap = cv2.VideoCapture(file_path)
-            if not cap.isOpened():
-                return False
-            
-            # Try to read the first frame
-            ret, frame = cap.read()
-            cap.release()
-            
-            return ret and frame is not None
+            # Opened and the first frame read
+            probe = self._probe(file_path)
+            return probe is not None and probe['readable']
             
         except Exception:
             return False
@@ -204,13 +367,12 @@ class VideoProcessor:
     def get_video_duration(self, video_path):
         """Get video duration in seconds"""
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
+            probe = self._probe(video_path)
+            if probe is None:
                 return 0
             
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            cap.release()
+            fps = probe['info']['fps']
+            frame_count = probe['info']['frame_count']
             
             return frame_count / fps if fps > 0 else 0
             
@@ -245,34 +407,35 @@ class VideoProcessor:
         }
         
         try:
-            # Check file existence and size
-            file_path_obj = Path(file_path)
-            if not file_path_obj.exists():
+            # Check file existence and size (one stat call)
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
                 validation_result['errors'].append('File does not exist')
                 return validation_result
             
             validation_result['file_exists'] = True
-            validation_result['file_size'] = file_path_obj.stat().st_size
+            validation_result['file_size'] = file_stat.st_size
             
             if validation_result['file_size'] == 0:
                 validation_result['errors'].append('File is empty')
                 return validation_result
             
             # Try to open with OpenCV
-            cap = cv2.VideoCapture(file_path)
-            if not cap.isOpened():
+            probe = self._probe(file_path)
+            if probe is None:
                 validation_result['errors'].append('Cannot open video with OpenCV')
-                cap.release()
                 return validation_result
             
             validation_result['readable'] = True
             
             # Get video properties
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+            info = probe['info']
+            frame_count = info['frame_count']
+            fps = info['fps']
+            width = info['width']
+            height = info['height']
+            fourcc = info['codec']
             
             validation_result['frame_count'] = frame_count
             validation_result['fps'] = fps
@@ -284,8 +447,7 @@ class VideoProcessor:
                 validation_result['duration'] = frame_count / fps
             
             # Check if we can read frames
-            ret, frame = cap.read()
-            if ret and frame is not None:
+            if probe['readable']:
                 validation_result['has_video_stream'] = True
             else:
                 validation_result['errors'].append('Cannot read video frames')
@@ -307,8 +469,6 @@ class VideoProcessor:
             elif validation_result['duration'] > 7200:  # 2 hours
                 validation_result['warnings'].append('Video duration is very long')
             
-            cap.release()
-            
             # Overall validation status
             validation_result['valid'] = (
                 validation_result['readable'] and 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Process pool worker for Open Video Watermark
+Runs the CPU-bound DCT watermarking outside the Flask process so several
+videos can be processed in parallel, one per CPU core.
+"""
+
+import time
+import logging
+
+import cv2
+
+import config
+from logging_setup import setup_worker_logging
+
+from watermark.dct_watermark import DCTWatermark
+from watermark.video_processor import VideoProcessor
+
+logger = logging.getLogger(__name__)
+
+# Queue used to report progress back to the web process (set per worker process)
+_progress_queue = None
+
+# Created once per worker process and reused for every task it runs
+_watermarker = None
+_processor = None
+
+def init_worker(progress_queue, cv_threads=None):
+    """
+    Initializer for pool processes
+
+    Args:
+        progress_queue: multiprocessing.Queue shared with the web process
+        cv_threads: OpenCV worker threads for this process (None keeps the default)
+    """
+    global _progress_queue, _watermarker, _processor
+    setup_worker_logging()
+    if cv_threads:
+        cv2.setNumThreads(cv_threads)
+    _progress_queue = progress_queue
+    _watermarker = DCTWatermark()
+    _processor = VideoProcessor()
+
+def process_video_task(task):
+    """
+    Embed the watermark for a single queued task. Runs inside a pool process.
+
+    Args:
+        task: Task dict built by the upload endpoint
+
+    Returns:
+        Tuple of (success, output file size in bytes)
+    """
+    task_id = task['id']
+    logger.info(f"📋 Processing task {task_id}: {task['original_filename']}")
+
+    # Report at most once per percent or per PROGRESS_EMIT_INTERVAL, plus the final frame
+    last_report = {'ts': 0.0, 'pct': -1}
+
+    def progress_callback(frame_num, total_frames, message="Processing"):
+        pct = (frame_num * 100) // total_frames if total_frames else 0
+        now = time.monotonic()
+        if (pct == last_report['pct'] and frame_num != total_frames
+                and now - last_report['ts'] < config.PROGRESS_EMIT_INTERVAL):
+            return
+        last_report['ts'] = now
+        last_report['pct'] = pct
+        _progress_queue.put((task_id, frame_num, total_frames, message))
+
+    progress_callback(0, 0, 'Initializing...')
+
+    _watermarker.reset()
+
+    return _processor.embed_watermark_in_video(
+        task['input_path'], task['output_path'], task['watermark_text'],
+        task['strength'], _watermarker, progress_callback,
+        capture_opts=task.get('capture_opts'),
+        frame_stride=task.get('frame_stride', 1)
+    )